@@ -0,0 +1,31 @@
+# Generated by Django 5.1.13 on 2026-10-17 09:12
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_pin_count(apps, schema_editor):
+    """Fill the new counter column from the existing pins"""
+    Board = apps.get_model('boards', 'Board')
+    Pin = apps.get_model('pins', 'Pin')
+
+    counts = Pin.objects.filter(board__isnull=False).values('board_id').annotate(n=Count('*')).values_list('board_id', 'n')
+    objs = [Board(pk=pk, pin_count=n) for pk, n in counts]
+    Board.objects.bulk_update(objs, ['pin_count'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0002_initial'),
+        ('pins', '0004_pin_is_premium_only'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='board',
+            name='pin_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_pin_count, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,14 @@
 from django.db import models
 from django.conf import settings
 from django.urls import reverse
+from core.models import CounterFieldsMixin
 
 
-class Board(models.Model):
+class Board(CounterFieldsMixin, models.Model):
     """Model representing a board (collection of pins)"""
     
+    counter_fields = ('pin_count',)
+    
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -14,6 +17,8 @@ class Board(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     is_private = models.BooleanField(default=False)
+    # Denormalized number of pins, maintained with F() updates
+    pin_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -27,7 +32,12 @@ class Board(models.Model):
     def get_absolute_url(self):
         return reverse('boards:detail', kwargs={'pk': self.pk})
     
-    @property
-    def pin_count(self):
-        """Return the number of pins in this board"""
-        return self.pins.count()
+    @classmethod
+    def move_pin(cls, from_board_id, to_board_id):
+        """Keep pin counters in sync when a pin changes board"""
+        from core.utils import adjust_counter
+        
+        if from_board_id == to_board_id:
+            return
+        adjust_counter(cls, from_board_id, 'pin_count', -1)
+        adjust_counter(cls, to_board_id, 'pin_count', 1)
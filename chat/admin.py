@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Friendship, ChatRoom, Message
+from .models import Friendship, FriendEdge, ChatRoom, ChatMembership, Message
 
 
 @admin.register(Friendship)
@@ -11,7 +11,7 @@ class FriendshipAdmin(admin.ModelAdmin):
 
 @admin.register(ChatRoom)
 class ChatRoomAdmin(admin.ModelAdmin):
-    list_display = ('id', 'get_participants', 'created_at', 'updated_at')
+    list_display = ('id', 'get_participants', 'pair_key', 'created_at', 'updated_at')
     filter_horizontal = ('participants',)
     
     def get_participants(self, obj):
@@ -21,10 +21,24 @@ class ChatRoomAdmin(admin.ModelAdmin):
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ('sender', 'room', 'content_preview', 'is_read', 'created_at')
-    list_filter = ('is_read', 'created_at')
+    list_display = ('sender', 'room', 'content_preview', 'created_at')
+    list_filter = ('created_at',)
     search_fields = ('sender__username', 'content')
     
     def content_preview(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
     content_preview.short_description = 'Content'
+
+
+@admin.register(ChatMembership)
+class ChatMembershipAdmin(admin.ModelAdmin):
+    list_display = ('user', 'room', 'unread_count', 'last_read_id')
+    search_fields = ('user__username',)
+    raw_id_fields = ('room', 'user')
+
+
+@admin.register(FriendEdge)
+class FriendEdgeAdmin(admin.ModelAdmin):
+    list_display = ('user', 'friend', 'created_at')
+    search_fields = ('user__username', 'friend__username')
+    raw_id_fields = ('user', 'friend')
@@ -1,7 +1,13 @@
+import asyncio
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from .models import ChatRoom, Message
+from core.pagination import InvalidCursor
+from .models import ChatRoom, ChatMembership, Message
+
+# Seconds to wait before persisting a read receipt, so a burst of incoming
+# messages results in a single write
+READ_RECEIPT_DELAY = 1.0
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -9,17 +15,24 @@ class ChatConsumer(AsyncWebsocketConsumer):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
         self.room_group_name = f'chat_{self.room_id}'
         self.user = self.scope['user']
+        self.read_receipt_task = None
+        self.pending_read_id = None
         
         if self.user.is_anonymous:
             await self.close()
             return
         
-        # Check if user is participant of this room
-        is_participant = await self.check_participant()
-        if not is_participant:
+        # Load the participants once (this also checks the user belongs
+        # here) and mark the room read in the same database hop
+        participant_ids, watermark = await self.join_room()
+        if self.user.id not in participant_ids:
             await self.close()
             return
         
+        # The other participant, cached for the lifetime of the connection
+        self.recipient_ids = [user_id for user_id in participant_ids if user_id != self.user.id]
+        self.recipient_id = self.recipient_ids[0] if self.recipient_ids else None
+        
         # Join room group
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -28,10 +41,15 @@ class ChatConsumer(AsyncWebsocketConsumer):
         
         await self.accept()
         
-        # Mark messages as read
-        await self.mark_messages_read()
+        # Tell the room how far this user has now read
+        await self.broadcast_read_receipt(watermark)
     
     async def disconnect(self, close_code):
+        # Persist a pending read receipt right away instead of dropping it
+        if self.read_receipt_task and not self.read_receipt_task.done():
+            self.read_receipt_task.cancel()
+            await self.read_up_to(self.pending_read_id)
+        
         # Leave room group
         if hasattr(self, 'room_group_name'):
             await self.channel_layer.group_discard(
@@ -41,12 +59,25 @@ class ChatConsumer(AsyncWebsocketConsumer):
     
     async def receive(self, text_data):
         data = json.loads(text_data)
+        
+        if data.get('action') == 'read_up_to':
+            try:
+                message_id = int(data.get('message_id'))
+            except (TypeError, ValueError):
+                return
+            await self.read_up_to(message_id)
+            return
+        
+        if data.get('action') == 'load_before':
+            await self.send(text_data=json.dumps(await self.load_history(data.get('cursor'))))
+            return
+        
         message_content = data.get('message', '').strip()
         
         if not message_content:
             return
         
-        # Save message to database
+        # Save message to database (and count the recipient's unread messages in the same hop)
         message = await self.save_message(message_content)
         
         # Send message to room group
@@ -65,7 +96,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
         
         # Send notification to recipient
-        recipient_id = await self.get_recipient_id()
+        recipient_id = self.recipient_id
         if recipient_id:
             await self.channel_layer.group_send(
                 f'notifications_{recipient_id}',
@@ -76,7 +107,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                         'message': f'{message["sender"]}: {message_content[:50]}',
                         'sender': message['sender'],
                         'link': f'/chat/{message["sender"]}/',
-                        'unread_count': await self.get_unread_count_for_user(recipient_id)
+                        'unread_count': message['recipient_unread']
                     }
                 }
             )
@@ -88,67 +119,87 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'message': event['message']
         }))
         
-        # Mark as read if not own message
+        # Mark as read if not own message (debounced)
         if event['message']['sender_id'] != self.user.id:
-            await self.mark_messages_read()
+            self.pending_read_id = max(self.pending_read_id or 0, event['message']['id'])
+            self.schedule_read_receipt()
+    
+    async def read_receipt(self, event):
+        # Tell the client how far a participant has read
+        await self.send(text_data=json.dumps({
+            'type': 'read_up_to',
+            'user_id': event['user_id'],
+            'message_id': event['message_id'],
+        }))
+    
+    async def read_up_to(self, message_id=None):
+        """Advance this user's read watermark and broadcast it to the room"""
+        await self.broadcast_read_receipt(await self.mark_messages_read(message_id))
+    
+    async def broadcast_read_receipt(self, watermark):
+        if watermark:
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                {
+                    'type': 'read_receipt',
+                    'user_id': self.user.id,
+                    'message_id': watermark,
+                }
+            )
+    
+    def schedule_read_receipt(self):
+        """Write the read receipt once the current burst of messages settles"""
+        if self.read_receipt_task is None or self.read_receipt_task.done():
+            self.read_receipt_task = asyncio.ensure_future(self.flush_read_receipt())
+    
+    async def flush_read_receipt(self):
+        await asyncio.sleep(READ_RECEIPT_DELAY)
+        await self.read_up_to(self.pending_read_id)
+    
+    # Data access. Each handler makes a single database_sync_to_async hop
+    # that runs all of its queries, so a frame costs one thread round trip
+    # and the connection is checked by close_old_connections around it.
     
     @database_sync_to_async
-    def check_participant(self):
-        try:
-            room = ChatRoom.objects.get(id=self.room_id)
-            return room.participants.filter(id=self.user.id).exists()
-        except ChatRoom.DoesNotExist:
-            return False
+    def join_room(self):
+        """The room's participant ids, plus the new read watermark when the user is one of them"""
+        participant_ids = list(
+            ChatRoom.participants.through.objects.filter(chatroom_id=self.room_id).values_list('user_id', flat=True)
+        )
+        if self.user.id not in participant_ids:
+            return participant_ids, None
+        return participant_ids, ChatMembership.mark_read(self.room_id, self.user.id)
     
     @database_sync_to_async
     def save_message(self, content):
-        room = ChatRoom.objects.get(id=self.room_id)
-        message = Message.objects.create(
-            room=room,
-            sender=self.user,
-            content=content
-        )
-        
-        # Update room timestamp
-        room.save()
+        """Insert the message; Message.save bumps the room and unread counters in the same transaction"""
+        message = Message(room_id=self.room_id, sender=self.user, content=content)
+        message.save(recipient_ids=self.recipient_ids)
         
         return {
             'id': message.id,
             'content': message.content,
-            'sender': message.sender.username,
-            'sender_id': message.sender.id,
-            'created_at': message.created_at.strftime('%H:%M')
+            'sender': self.user.username,
+            'sender_id': self.user.id,
+            'created_at': message.created_at.strftime('%H:%M'),
+            'recipient_unread': ChatMembership.total_unread(self.recipient_id) if self.recipient_id else 0
         }
     
     @database_sync_to_async
-    def mark_messages_read(self):
-        try:
-            room = ChatRoom.objects.get(id=self.room_id)
-            room.messages.filter(is_read=False).exclude(sender=self.user).update(is_read=True)
-        except ChatRoom.DoesNotExist:
-            pass
-    
-    @database_sync_to_async
-    def get_recipient_id(self):
-        """Get the other participant's ID in this chat room"""
+    def load_history(self, cursor):
+        """One page of older messages, shaped like message_history_api's response"""
         try:
-            room = ChatRoom.objects.get(id=self.room_id)
-            other_user = room.participants.exclude(id=self.user.id).first()
-            return other_user.id if other_user else None
-        except ChatRoom.DoesNotExist:
-            return None
+            page = Message.history_paginator(self.room_id).get_page(cursor)
+        except InvalidCursor as e:
+            return {'type': 'error', 'error': str(e)}
+        
+        return {
+            'type': 'history',
+            'messages': [message.as_json() for message in reversed(page.items)],
+            'has_more': page.has_more,
+            'next_cursor': page.next_cursor,
+        }
     
     @database_sync_to_async
-    def get_unread_count_for_user(self, user_id):
-        """Get unread message count for a specific user"""
-        from users.models import User
-        try:
-            user = User.objects.get(id=user_id)
-            user_rooms = ChatRoom.objects.filter(participants=user)
-            unread_count = Message.objects.filter(
-                room__in=user_rooms,
-                is_read=False
-            ).exclude(sender=user).count()
-            return unread_count
-        except User.DoesNotExist:
-            return 0
+    def mark_messages_read(self, up_to=None):
+        return ChatMembership.mark_read(self.room_id, self.user.id, up_to)
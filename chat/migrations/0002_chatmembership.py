@@ -0,0 +1,53 @@
+# Generated by Django 5.1.13 on 2026-10-17 13:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def create_memberships(apps, schema_editor):
+    """One membership per room participant, seeded with the current unread count"""
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    ChatMembership = apps.get_model('chat', 'ChatMembership')
+    Message = apps.get_model('chat', 'Message')
+
+    unread = {}
+    for room_id, sender_id, n in (
+        Message.objects.filter(is_read=False)
+        .order_by()
+        .values('room_id', 'sender_id')
+        .annotate(n=Count('id'))
+        .values_list('room_id', 'sender_id', 'n')
+    ):
+        unread.setdefault(room_id, []).append((sender_id, n))
+
+    memberships = []
+    for room_id, user_id in ChatRoom.participants.through.objects.values_list('chatroom_id', 'user_id').iterator(chunk_size=2000):
+        count = sum(n for sender_id, n in unread.get(room_id, []) if sender_id != user_id)
+        memberships.append(ChatMembership(room_id=room_id, user_id=user_id, unread_count=count))
+    ChatMembership.objects.bulk_create(memberships, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='chat.chatroom')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('room', 'user')},
+            },
+        ),
+        migrations.RunPython(create_memberships, migrations.RunPython.noop),
+    ]
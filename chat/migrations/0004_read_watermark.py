@@ -0,0 +1,57 @@
+# Generated by Django 5.1.13 on 2026-10-17 15:20
+
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+
+def set_watermarks(apps, schema_editor):
+    """Place each watermark just before the member's oldest unread message"""
+    ChatMembership = apps.get_model('chat', 'ChatMembership')
+    Message = apps.get_model('chat', 'Message')
+
+    last_ids = dict(
+        Message.objects.order_by().values('room_id').annotate(last=Max('id')).values_list('room_id', 'last')
+    )
+    first_unread = {}
+    for room_id, sender_id, first in (
+        Message.objects.filter(is_read=False)
+        .order_by()
+        .values('room_id', 'sender_id')
+        .annotate(first=Min('id'))
+        .values_list('room_id', 'sender_id', 'first')
+    ):
+        first_unread.setdefault(room_id, []).append((sender_id, first))
+
+    memberships = []
+    for membership in ChatMembership.objects.iterator(chunk_size=2000):
+        unread = [first for sender_id, first in first_unread.get(membership.room_id, []) if sender_id != membership.user_id]
+        membership.last_read_id = min(unread) - 1 if unread else last_ids.get(membership.room_id, 0)
+        memberships.append(membership)
+        if len(memberships) >= 2000:
+            ChatMembership.objects.bulk_update(memberships, ['last_read_id'])
+            memberships = []
+    ChatMembership.objects.bulk_update(memberships, ['last_read_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_friendship_message_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmembership',
+            name='last_read_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(set_watermarks, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='message',
+            name='message_room_unread_idx',
+        ),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+    ]
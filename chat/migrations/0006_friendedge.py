@@ -0,0 +1,41 @@
+# Generated by Django 5.1.13 on 2026-10-17 16:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_edges(apps, schema_editor):
+    """Two edges, one per direction, for every accepted friendship"""
+    Friendship = apps.get_model('chat', 'Friendship')
+    FriendEdge = apps.get_model('chat', 'FriendEdge')
+
+    edges = []
+    for from_id, to_id in Friendship.objects.filter(status='accepted').values_list('from_user_id', 'to_user_id').iterator(chunk_size=2000):
+        edges.append(FriendEdge(user_id=from_id, friend_id=to_id))
+        edges.append(FriendEdge(user_id=to_id, friend_id=from_id))
+    FriendEdge.objects.bulk_create(edges, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_message_room_id_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FriendEdge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('friend', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friend_of_edges', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='friend_edges', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'friend')},
+            },
+        ),
+        migrations.RunPython(populate_edges, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.1.13 on 2026-10-17 17:50
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def merged_watermark(ChatMembership, Message, room_ids, user_id):
+    """The id just before the oldest message ``user_id`` hasn't read in any of ``room_ids``"""
+    read = dict(
+        ChatMembership.objects.filter(room_id__in=room_ids, user_id=user_id).values_list('room_id', 'last_read_id')
+    )
+    first_unread = [
+        Message.objects.filter(room_id=room_id, id__gt=read.get(room_id, 0))
+        .exclude(sender_id=user_id)
+        .aggregate(first=Min('id'))['first']
+        for room_id in room_ids
+    ]
+    first_unread = [message_id for message_id in first_unread if message_id is not None]
+    if first_unread:
+        return min(first_unread) - 1
+    # Everything has been read: the newest message of any of the rooms
+    return Message.objects.filter(room_id__in=room_ids).aggregate(last=Max('id'))['last'] or 0
+
+
+def dedupe_rooms(apps, schema_editor):
+    """
+    Give every two-person room its pair key. Where a pair has several rooms,
+    the oldest one keeps the conversation: the others' messages move into it,
+    each member's read watermark is placed just before the oldest message
+    still unread in any of the rooms (so nothing unread is marked read),
+    unread counts are recounted and the duplicates are deleted.
+    """
+    ChatRoom = apps.get_model('chat', 'ChatRoom')
+    ChatMembership = apps.get_model('chat', 'ChatMembership')
+    Message = apps.get_model('chat', 'Message')
+    Participant = ChatRoom.participants.through
+
+    participants = defaultdict(list)
+    two_person_rooms = (
+        Participant.objects.values('chatroom_id').annotate(n=Count('user_id')).filter(n=2).values('chatroom_id')
+    )
+    for room_id, user_id in Participant.objects.filter(chatroom_id__in=two_person_rooms).values_list('chatroom_id', 'user_id'):
+        participants[room_id].append(user_id)
+
+    rooms_by_pair = defaultdict(list)
+    for room_id, user_ids in participants.items():
+        rooms_by_pair['%d:%d' % (min(user_ids), max(user_ids))].append(room_id)
+
+    for pair_key, room_ids in rooms_by_pair.items():
+        room_ids.sort()
+        keep, duplicates = room_ids[0], room_ids[1:]
+        if duplicates:
+            # Watermarks are per room, so work them out before the messages move
+            watermarks = {user_id: merged_watermark(ChatMembership, Message, room_ids, user_id)
+                          for user_id in participants[keep]}
+
+            Message.objects.filter(room_id__in=duplicates).update(room_id=keep)
+            latest = ChatRoom.objects.filter(id__in=room_ids).aggregate(last=Max('updated_at'))['last']
+            ChatRoom.objects.filter(id=keep).update(updated_at=latest)
+
+            for user_id, last_read_id in watermarks.items():
+                unread = Message.objects.filter(room_id=keep, id__gt=last_read_id).exclude(sender_id=user_id).count()
+                ChatMembership.objects.update_or_create(
+                    room_id=keep, user_id=user_id,
+                    defaults={'last_read_id': last_read_id, 'unread_count': unread}
+                )
+            ChatRoom.objects.filter(id__in=duplicates).delete()
+
+        ChatRoom.objects.filter(id=keep).update(pair_key=pair_key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_friendsuggestion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='pair_key',
+            field=models.CharField(blank=True, editable=False, max_length=50, null=True, unique=True),
+        ),
+        migrations.RunPython(dedupe_rooms, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,22 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Max, Sum
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from core.pagination import KeysetPaginator
+
+
+class FriendshipQuerySet(models.QuerySet):
+    """Keeps the FriendEdge adjacency table in step with bulk deletes"""
+    
+    def delete(self):
+        with transaction.atomic():
+            pairs = list(self.filter(status='accepted').values_list('from_user_id', 'to_user_id'))
+            result = super().delete()
+            for from_id, to_id in pairs:
+                FriendEdge.disconnect(from_id, to_id)
+        return result
 
 
 class Friendship(models.Model):
@@ -25,36 +42,157 @@ class Friendship(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = FriendshipQuerySet.as_manager()
+    
     class Meta:
         unique_together = ('from_user', 'to_user')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['to_user', 'status'], name='friendship_to_status_idx'),
+            models.Index(fields=['from_user', 'status'], name='friendship_from_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.from_user.username} -> {self.to_user.username} ({self.status})"
     
+    def save(self, *args, **kwargs):
+        """Keep FriendEdge rows and suggestions in step with the status change, in the same transaction"""
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                FriendSuggestion.forget_pair(self.from_user_id, self.to_user_id)
+            if self.status == 'accepted':
+                FriendEdge.connect(self.from_user_id, self.to_user_id)
+            elif not adding:
+                FriendEdge.disconnect(self.from_user_id, self.to_user_id)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if self.status == 'accepted':
+                FriendEdge.disconnect(self.from_user_id, self.to_user_id)
+        return result
+    
     @classmethod
     def are_friends(cls, user1, user2):
-        """Check if two users are friends"""
-        return cls.objects.filter(
-            models.Q(from_user=user1, to_user=user2, status='accepted') |
-            models.Q(from_user=user2, to_user=user1, status='accepted')
-        ).exists()
+        """Check if two users are friends (a cached set lookup)"""
+        return user2.id in FriendEdge.friend_ids(user1.id)
     
     @classmethod
     def get_friends(cls, user):
         """Get all friends of a user"""
-        friend_ids = cls.objects.filter(
-            models.Q(from_user=user, status='accepted') |
-            models.Q(to_user=user, status='accepted')
-        ).values_list('from_user', 'to_user')
-        
-        # Flatten and remove self
-        friends_ids = set()
-        for from_id, to_id in friend_ids:
-            friends_ids.add(from_id if from_id != user.id else to_id)
-        
         from users.models import User
-        return User.objects.filter(id__in=friends_ids)
+        return User.objects.filter(friend_of_edges__user_id=user.id)
+
+
+class FriendEdge(models.Model):
+    """
+    Symmetric adjacency table of accepted friendships: one row per direction,
+    so "friends of X" is a range scan on the (user, friend) unique index
+    instead of an OR over both Friendship columns.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='friend_edges'
+    )
+    friend = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='friend_of_edges'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('user', 'friend')
+    
+    def __str__(self):
+        return f"{self.user_id} <-> {self.friend_id}"
+    
+    @staticmethod
+    def cache_key(user_id):
+        return f'friends:{user_id}'
+    
+    @classmethod
+    def invalidate(cls, user_ids):
+        keys = [cls.cache_key(user_id) for user_id in user_ids]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+    
+    @classmethod
+    def connect(cls, user_id, friend_id):
+        cls.objects.bulk_create(
+            [cls(user_id=user_id, friend_id=friend_id), cls(user_id=friend_id, friend_id=user_id)],
+            ignore_conflicts=True
+        )
+        cls.invalidate([user_id, friend_id])
+    
+    @classmethod
+    def disconnect(cls, user_id, friend_id):
+        cls.objects.filter(
+            models.Q(user_id=user_id, friend_id=friend_id) |
+            models.Q(user_id=friend_id, friend_id=user_id)
+        ).delete()
+        cls.invalidate([user_id, friend_id])
+    
+    @classmethod
+    def friend_ids(cls, user_id):
+        """The user's friend ids as a set, served from the cache when possible"""
+        key = cls.cache_key(user_id)
+        ids = cache.get(key)
+        if ids is None:
+            ids = set(cls.objects.filter(user_id=user_id).values_list('friend_id', flat=True))
+            cache.set(key, ids, settings.FRIENDS_CACHE_TTL)
+        return ids
+
+
+class FriendSuggestion(models.Model):
+    """
+    Precomputed "people you may know" row, ranked by mutual friends and
+    shared liked pins. Rebuilt in batches by ``rebuild_friend_suggestions``
+    (see chat.suggestions) and read with one (user, -score) index range scan.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='friend_suggestions'
+    )
+    candidate = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='suggested_to'
+    )
+    score = models.PositiveIntegerField(default=0)
+    mutual_friends = models.PositiveIntegerField(default=0)
+    shared_likes = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('user', 'candidate')
+        indexes = [
+            models.Index(fields=['user', '-score'], name='suggestion_user_score_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.candidate_id} for {self.user_id} ({self.score})"
+    
+    @classmethod
+    def for_user(cls, user, limit=20):
+        """The user's top suggested active users, annotated with their mutual friend count"""
+        from users.models import User
+        return (
+            User.objects.filter(suggested_to__user_id=user.id, is_active=True)
+            .annotate(mutual_friends=F('suggested_to__mutual_friends'))
+            .order_by('-suggested_to__score', 'suggested_to__candidate_id')[:limit]
+        )
+    
+    @classmethod
+    def forget_pair(cls, user_id, other_id):
+        """Drop suggestions between two users once either sends a request"""
+        cls.objects.filter(
+            models.Q(user_id=user_id, candidate_id=other_id) |
+            models.Q(user_id=other_id, candidate_id=user_id)
+        ).delete()
 
 
 class ChatRoom(models.Model):
@@ -63,6 +201,9 @@ class ChatRoom(models.Model):
         settings.AUTH_USER_MODEL,
         related_name='chat_rooms'
     )
+    # '<lower user id>:<higher user id>' for private rooms; the unique index
+    # makes the room lookup a point read and stops duplicate rooms
+    pair_key = models.CharField(max_length=50, unique=True, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -79,17 +220,99 @@ class ChatRoom(models.Model):
     def last_message(self):
         return self.messages.first()
     
+    @classmethod
+    def inbox_for(cls, user):
+        """
+        The user's rooms annotated with everything the inbox shows - the other
+        participant's id, last-message preview/time/sender and the maintained
+        unread counter - as correlated subqueries, so the whole inbox is a
+        single query.
+        """
+        other_participant = cls.participants.through.objects.filter(
+            chatroom_id=models.OuterRef('pk')
+        ).exclude(user_id=user.id).values('user_id')[:1]
+        
+        last_message = Message.objects.filter(room_id=models.OuterRef('pk')).order_by('-created_at', '-id')
+        
+        unread = ChatMembership.objects.filter(
+            room_id=models.OuterRef('pk'),
+            user_id=user.id
+        ).values('unread_count')[:1]
+        
+        return user.chat_rooms.annotate(
+            other_user_id=models.Subquery(other_participant),
+            last_message_id=models.Subquery(last_message.values('id')[:1]),
+            last_message_content=models.Subquery(last_message.values('content')[:1]),
+            last_message_sender_id=models.Subquery(last_message.values('sender_id')[:1]),
+            last_message_time=models.Subquery(last_message.values('created_at')[:1]),
+            unread_count=Coalesce(models.Subquery(unread), 0),
+        ).filter(other_user_id__isnull=False)
+    
+    @staticmethod
+    def pair_key_for(user1_id, user2_id):
+        return f'{min(user1_id, user2_id)}:{max(user1_id, user2_id)}'
+    
     @classmethod
     def get_or_create_room(cls, user1, user2):
-        """Get or create a chat room between two users"""
-        # Check if room already exists
-        room = cls.objects.filter(participants=user1).filter(participants=user2).first()
+        """
+        Get or create the chat room between two users. Looked up by pair key;
+        when two requests race to create it, the unique index lets one win
+        and the other reads the winner's room.
+        """
+        pair_key = cls.pair_key_for(user1.id, user2.id)
+        room = cls.objects.filter(pair_key=pair_key).first()
+        if room:
+            return room
         
-        if not room:
-            room = cls.objects.create()
-            room.participants.add(user1, user2)
+        try:
+            with transaction.atomic():
+                room = cls.objects.create(pair_key=pair_key)
+                room.participants.add(user1, user2)
+                ChatMembership.objects.bulk_create(
+                    [ChatMembership(room=room, user=user1), ChatMembership(room=room, user=user2)],
+                    ignore_conflicts=True
+                )
+        except IntegrityError:
+            room = cls.objects.get(pair_key=pair_key)
         
         return room
+    
+    @classmethod
+    def get_or_create_rooms(cls, user, others):
+        """
+        ``get_or_create_room`` for many pairs at once: returns ``{other user id:
+        room id}``, creating missing rooms, participants and memberships with
+        one bulk insert each. Concurrent creators are resolved by the pair key
+        index (ignore_conflicts) and a locking re-read, which sees rows
+        committed after this transaction's snapshot. Call it outside any
+        longer transaction; raises ChatRoom.DoesNotExist if a room still
+        can't be found.
+        """
+        keys = {cls.pair_key_for(user.id, other.id): other.id for other in others}
+        rooms = dict(cls.objects.filter(pair_key__in=keys).values_list('pair_key', 'id'))
+        
+        missing = [key for key in keys if key not in rooms]
+        if missing:
+            with transaction.atomic():
+                cls.objects.bulk_create([cls(pair_key=key) for key in missing], ignore_conflicts=True)
+                created = dict(
+                    cls.objects.select_for_update().filter(pair_key__in=missing).values_list('pair_key', 'id')
+                )
+                if len(created) < len(missing):
+                    raise cls.DoesNotExist(f'Chat rooms {sorted(set(missing) - set(created))} could not be created')
+                cls.participants.through.objects.bulk_create(
+                    [cls.participants.through(chatroom_id=room_id, user_id=user_id)
+                     for key, room_id in created.items() for user_id in (user.id, keys[key])],
+                    ignore_conflicts=True
+                )
+                ChatMembership.objects.bulk_create(
+                    [ChatMembership(room_id=room_id, user_id=user_id)
+                     for key, room_id in created.items() for user_id in (user.id, keys[key])],
+                    ignore_conflicts=True
+                )
+            rooms.update(created)
+        
+        return {keys[key]: room_id for key, room_id in rooms.items()}
 
 
 class Message(models.Model):
@@ -105,11 +328,240 @@ class Message(models.Model):
         related_name='sent_messages'
     )
     content = models.TextField()
-    is_read = models.BooleanField(default=False)
+    # Pin shared in this message, rendered as a preview card
+    pin = models.ForeignKey(
+        'pins.Pin',
+        on_delete=models.SET_NULL,
+        related_name='shares',
+        null=True,
+        blank=True
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['room', '-created_at'], name='message_room_created_idx'),
+            models.Index(fields=['room', 'id'], name='message_room_id_idx'),
+        ]
+    
+    HISTORY_PAGE_SIZE = 30
     
     def __str__(self):
         return f"{self.sender.username}: {self.content[:50]}"
+    
+    @classmethod
+    def history_paginator(cls, room_id, per_page=HISTORY_PAGE_SIZE):
+        """Keyset paginator over a room's messages, newest first, seeking on the (room, id) index"""
+        return KeysetPaginator(
+            cls.objects.filter(room_id=room_id).select_related('pin').only(
+                'id', 'sender_id', 'content', 'created_at', 'pin__id', 'pin__title', 'pin__image', 'pin__renditions'
+            ),
+            ['-id'],
+            per_page=per_page,
+            name=f'history:{room_id}'
+        )
+    
+    def as_json(self):
+        """Compact representation used by the history API and the chat socket"""
+        return {
+            'id': self.id,
+            'content': self.content,
+            'sender_id': self.sender_id,
+            'created_at': self.created_at.strftime('%H:%M'),
+            'date': self.created_at.strftime('%Y-%m-%d'),
+            'pin': self.pin_preview,
+        }
+    
+    @property
+    def pin_preview(self):
+        """What the chat needs to draw the shared pin's card, or None"""
+        if self.pin_id is None:
+            return None
+        pin = self.pin
+        return {
+            'id': pin.id,
+            'title': pin.title,
+            'image': pin.rendition_url('thumb', 'jpeg') or pin.image.url,
+            'link': f'/pins/{pin.id}/',
+        }
+    
+    @classmethod
+    def share_pin(cls, sender, pin, recipients, content):
+        """
+        Send ``pin`` to each of ``recipients`` (users the caller has already
+        checked are friends) in their private rooms: rooms are resolved in
+        bulk, the messages go in with one bulk insert, and the rooms'
+        activity time and the recipients' unread counters are bumped with one
+        update each. Returns ``(messages, unread totals by recipient id)``.
+        """
+        # Rooms are resolved in their own transaction first; a racing request
+        # creating the same room has to be visible to its re-read
+        rooms = ChatRoom.get_or_create_rooms(sender, recipients)
+        with transaction.atomic():
+            messages = cls.objects.bulk_create([
+                cls(room_id=rooms[recipient.id], sender=sender, content=content, pin=pin)
+                for recipient in recipients
+            ])
+            # bulk_create doesn't return ids on MySQL; read the new rows back
+            if any(message.pk is None for message in messages):
+                latest_ids = (
+                    cls.objects.filter(room_id__in=rooms.values(), sender=sender, pin=pin)
+                    .values('room_id')
+                    .annotate(last=Max('id'))
+                    .values_list('last', flat=True)
+                )
+                messages = list(cls.objects.filter(pk__in=list(latest_ids)))
+                for message in messages:
+                    message.pin = pin
+            
+            room_ids = list(rooms.values())
+            ChatRoom.objects.filter(pk__in=room_ids).update(updated_at=timezone.now())
+            ChatMembership.objects.filter(room_id__in=room_ids).exclude(user_id=sender.id).update(
+                unread_count=F('unread_count') + 1
+            )
+            recipient_ids = [recipient.id for recipient in recipients]
+            ChatMembership.bump_cached(recipient_ids)
+            unread = dict(
+                ChatMembership.objects.filter(user_id__in=recipient_ids)
+                .values('user_id')
+                .annotate(total=Sum('unread_count'))
+                .values_list('user_id', 'total')
+            )
+        return messages, unread
+    
+    def save(self, *args, recipient_ids=None, **kwargs):
+        """
+        Bump the room's activity time and the recipients' unread counters in
+        the same transaction as the insert. Callers that already know the
+        recipients (the chat consumer) pass ``recipient_ids`` to skip looking
+        them up.
+        """
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                ChatRoom.objects.filter(pk=self.room_id).update(updated_at=self.created_at)
+                ChatMembership.message_created(self, recipient_ids)
+
+
+class ChatMembership(models.Model):
+    """A user's membership in a chat room, holding their unread counter"""
+    room = models.ForeignKey(
+        ChatRoom,
+        on_delete=models.CASCADE,
+        related_name='memberships'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='chat_memberships'
+    )
+    unread_count = models.PositiveIntegerField(default=0)
+    # Read watermark: every message in the room with id <= last_read_id has been read
+    last_read_id = models.BigIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('room', 'user')
+    
+    def __str__(self):
+        return f"{self.user_id} in room {self.room_id} ({self.unread_count} unread)"
+    
+    @staticmethod
+    def cache_key(user_id):
+        return f'unread:chat:{user_id}'
+    
+    @classmethod
+    def invalidate(cls, user_ids):
+        keys = [cls.cache_key(user_id) for user_id in user_ids]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+    
+    @classmethod
+    def bump_cached(cls, user_ids):
+        """Increment cached totals after commit; missing keys are recomputed on the next read"""
+        keys = [cls.cache_key(user_id) for user_id in user_ids]
+        
+        def bump():
+            for key in keys:
+                try:
+                    cache.incr(key)
+                except ValueError:
+                    pass
+        
+        transaction.on_commit(bump)
+    
+    @classmethod
+    def message_created(cls, message, recipient_ids=None):
+        """Count a new message as unread for everyone in the room but its sender"""
+        recipients = cls.objects.filter(room_id=message.room_id)
+        if recipient_ids is None:
+            recipients = recipients.exclude(user_id=message.sender_id)
+            recipient_ids = list(recipients.values_list('user_id', flat=True))
+        else:
+            recipients = recipients.filter(user_id__in=recipient_ids)
+        recipients.update(unread_count=F('unread_count') + 1)
+        cls.bump_cached(recipient_ids)
+    
+    @staticmethod
+    def unread_after(room_id, user_id, last_read_id):
+        """Messages the user received in the room after the watermark (a (room, id) index range)"""
+        return Message.objects.filter(room_id=room_id, id__gt=last_read_id).exclude(sender_id=user_id)
+    
+    @classmethod
+    def mark_read(cls, room_id, user_id, up_to=None):
+        """
+        Move the user's read watermark forward to ``up_to`` (default: the
+        newest message in the room) and recount what is still unread after
+        it, as a single-row update. Returns the new watermark, or None when
+        it didn't move.
+        """
+        latest = Message.objects.filter(room_id=room_id)
+        if up_to is not None:
+            # Clamp to a message that exists so a client can't read ahead
+            latest = latest.filter(id__lte=up_to)
+        up_to = latest.aggregate(last=Max('id'))['last']
+        if up_to is None:
+            return None
+        
+        remaining = (
+            cls.unread_after(room_id, user_id, up_to)
+            .order_by()
+            .values('room_id')
+            .annotate(n=Count('id'))
+            .values('n')
+        )
+        updated = cls.objects.filter(room_id=room_id, user_id=user_id, last_read_id__lt=up_to).update(
+            last_read_id=up_to,
+            unread_count=Coalesce(models.Subquery(remaining), 0)
+        )
+        if not updated:
+            return None
+        
+        cls.invalidate([user_id])
+        return up_to
+    
+    @classmethod
+    def recount_unread(cls, room_ids):
+        """Recount every membership of ``room_ids`` from its watermark, e.g. after messages were deleted"""
+        remaining = (
+            Message.objects.filter(room_id=models.OuterRef('room_id'), id__gt=models.OuterRef('last_read_id'))
+            .exclude(sender_id=models.OuterRef('user_id'))
+            .order_by()
+            .values('room_id')
+            .annotate(n=Count('id'))
+            .values('n')
+        )
+        memberships = cls.objects.filter(room_id__in=room_ids)
+        user_ids = list(memberships.values_list('user_id', flat=True))
+        memberships.update(unread_count=Coalesce(models.Subquery(remaining), 0))
+        cls.invalidate(user_ids)
+    
+    @classmethod
+    def total_unread(cls, user_id):
+        """Unread messages across all of a user's rooms, served from the cache when possible"""
+        key = cls.cache_key(user_id)
+        count = cache.get(key)
+        if count is None:
+            count = cls.objects.filter(user_id=user_id).aggregate(total=Sum('unread_count'))['total'] or 0
+            cache.set(key, count, settings.UNREAD_CACHE_TTL)
+        return count
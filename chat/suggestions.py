@@ -0,0 +1,108 @@
+"""
+Friend suggestions ranked by mutual friends and shared liked pins.
+
+``rebuild_suggestions`` recomputes the FriendSuggestion rows for a batch of
+users with two grouped queries: friends-of-friends over the FriendEdge
+adjacency table, and co-likers over the pin likes table. Pins with more than
+FRIEND_SUGGESTION_MAX_PIN_LIKES likes are skipped, since a viral pin says
+little about two users and would blow up the pair count. Candidates the user
+already has any relationship with are dropped, the rest are scored and the
+top FRIEND_SUGGESTIONS_PER_USER replace the user's old rows.
+
+Pins are moved (not copied) onto the saver's board, so two users can't have
+saved the same pin; likes are the shared-taste signal.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from core.utils import pk_ranges
+from pins.models import Pin
+from .models import FriendEdge, FriendSuggestion, Friendship
+
+# A mutual friend counts as much as this many shared liked pins
+MUTUAL_FRIEND_WEIGHT = 10
+
+
+def mutual_friend_counts(user_ids):
+    """{(user_id, candidate_id): mutual friends} for friends-of-friends of ``user_ids``"""
+    rows = (
+        FriendEdge.objects.filter(user__friend_of_edges__user_id__in=user_ids)
+        .values(source=F('user__friend_of_edges__user_id'), candidate=F('friend_id'))
+        .annotate(n=Count('id'))
+        .values_list('source', 'candidate', 'n')
+    )
+    return {(source, candidate): n for source, candidate, n in rows if source != candidate}
+
+
+def shared_like_counts(user_ids):
+    """{(user_id, candidate_id): pins both liked}, ignoring very popular pins"""
+    Like = Pin.likes.through
+    rows = (
+        Like.objects.filter(
+            pin__likes__id__in=user_ids,
+            pin__like_count__lte=settings.FRIEND_SUGGESTION_MAX_PIN_LIKES
+        )
+        .values(source=F('pin__likes__id'), candidate=F('user_id'))
+        .annotate(n=Count('id'))
+        .values_list('source', 'candidate', 'n')
+    )
+    return {(source, candidate): n for source, candidate, n in rows if source != candidate}
+
+
+def related_user_ids(user_ids):
+    """{user_id: ids of everyone they have a friendship row with, in any status}"""
+    related = defaultdict(set)
+    for from_id, to_id in Friendship.objects.filter(
+        Q(from_user_id__in=user_ids) | Q(to_user_id__in=user_ids)
+    ).values_list('from_user_id', 'to_user_id'):
+        related[from_id].add(to_id)
+        related[to_id].add(from_id)
+    return related
+
+
+def rebuild_suggestions(user_ids):
+    """Recompute and store suggestions for ``user_ids``; returns the number of rows written"""
+    mutual = mutual_friend_counts(user_ids)
+    likes = shared_like_counts(user_ids)
+    related = related_user_ids(user_ids)
+
+    candidates = defaultdict(list)
+    for source, candidate in mutual.keys() | likes.keys():
+        if candidate in related[source]:
+            continue
+        mutual_friends = mutual.get((source, candidate), 0)
+        shared_likes = likes.get((source, candidate), 0)
+        candidates[source].append(FriendSuggestion(
+            user_id=source,
+            candidate_id=candidate,
+            score=mutual_friends * MUTUAL_FRIEND_WEIGHT + shared_likes,
+            mutual_friends=mutual_friends,
+            shared_likes=shared_likes,
+        ))
+
+    limit = settings.FRIEND_SUGGESTIONS_PER_USER
+    suggestions = []
+    for rows in candidates.values():
+        rows.sort(key=lambda row: (-row.score, row.candidate_id))
+        suggestions.extend(rows[:limit])
+
+    with transaction.atomic():
+        FriendSuggestion.objects.filter(user_id__in=user_ids).delete()
+        FriendSuggestion.objects.bulk_create(suggestions, batch_size=1000)
+    return len(suggestions)
+
+
+def rebuild_all(batch_size=500):
+    """Rebuild suggestions for every user, ``batch_size`` user ids at a time; returns (users, rows)"""
+    from users.models import User
+
+    users = rows = 0
+    for start, end in pk_ranges(User, batch_size):
+        user_ids = list(User.objects.filter(pk__gte=start, pk__lt=end).values_list('pk', flat=True))
+        if user_ids:
+            users += len(user_ids)
+            rows += rebuild_suggestions(user_ids)
+    return users, rows
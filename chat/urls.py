@@ -16,4 +16,6 @@ urlpatterns = [
     path('api/friends/', views.get_friends_api, name='get_friends_api'),
     path('api/share-pin/', views.share_pin_api, name='share_pin_api'),
     path('api/unread-count/', views.get_unread_count, name='get_unread_count'),
+    path('api/inbox/', views.inbox_api, name='inbox_api'),
+    path('api/rooms/<int:room_id>/messages/', views.message_history_api, name='message_history_api'),
 ]
@@ -2,11 +2,33 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
-from django.db.models import Q, Count, Max
-from .models import Friendship, ChatRoom, Message
+from django.db.models import Exists, OuterRef, Q
+from core.pagination import KeysetPaginator, InvalidCursor
+from .models import Friendship, FriendEdge, FriendSuggestion, ChatRoom, ChatMembership, Message
 from users.models import User
-from notifications.models import Notification
-from notifications.utils import send_notification_to_user
+from users.search import search_users
+from notifications.dispatch import notify
+
+INBOX_PAGE_SIZE = 30
+# Most friends one share request can send a pin to
+SHARE_MAX_RECIPIENTS = 50
+
+
+def known_user_ids(user):
+    """
+    Ids of the user and everyone they already have a relationship with;
+    friends come from the cached friend set, so only other relationships
+    are loaded
+    """
+    other_relationships = Friendship.objects.filter(
+        Q(from_user=user) | Q(to_user=user)
+    ).exclude(status='accepted').values_list('from_user_id', 'to_user_id')
+    
+    known_ids = FriendEdge.friend_ids(user.id) | {user.id}
+    for from_id, to_id in other_relationships:
+        known_ids.add(from_id)
+        known_ids.add(to_id)
+    return known_ids
 
 
 @login_required
@@ -29,27 +51,29 @@ def friends_list(request):
     # Search functionality
     search_query = request.GET.get('search', '').strip()
     
-    # Get all users except current user and existing relationships
-    friend_ids = Friendship.objects.filter(
-        Q(from_user=request.user) | Q(to_user=request.user)
-    ).values_list('from_user_id', 'to_user_id')
-    
-    excluded_ids = set([request.user.id])
-    for from_id, to_id in friend_ids:
-        excluded_ids.add(from_id)
-        excluded_ids.add(to_id)
-    
-    # Suggested friends with search
-    suggested_friends = User.objects.exclude(id__in=excluded_ids)
-    
     if search_query:
-        suggested_friends = suggested_friends.filter(
-            Q(username__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(full_name__icontains=search_query)
-        )
-    
-    suggested_friends = suggested_friends[:20]  # Show more results
+        excluded_ids = known_user_ids(request.user)
+        matches = search_users(search_query)[:20 + len(excluded_ids)]
+        suggested_friends = [user for user in matches if user.id not in excluded_ids][:20]
+    else:
+        # Precomputed, ranked suggestions (see chat.suggestions)
+        suggested_friends = list(FriendSuggestion.for_user(request.user, limit=20))
+        if not suggested_friends:
+            # Nothing computed for this user yet (new account, or before the
+            # next rebuild): the newest active users they don't know, excluded
+            # with correlated subqueries rather than a list of ids
+            friend_edges = FriendEdge.objects.filter(user_id=request.user.id, friend_id=OuterRef('pk'))
+            other_relationships = Friendship.objects.filter(
+                Q(from_user_id=request.user.id, to_user_id=OuterRef('pk')) |
+                Q(to_user_id=request.user.id, from_user_id=OuterRef('pk'))
+            ).exclude(status='accepted')
+            suggested_friends = (
+                User.objects.filter(is_active=True)
+                .exclude(pk=request.user.pk)
+                .exclude(Exists(friend_edges))
+                .exclude(Exists(other_relationships))
+                .order_by('-date_joined')[:20]
+            )
     
     context = {
         'friends': friends,
@@ -92,14 +116,13 @@ def send_friend_request(request, username):
     )
     
     # Create notification
-    notification = Notification.objects.create(
-        recipient=to_user,
+    notify(
+        to_user,
+        'follow',
+        f'{request.user.username} sent you a friend request',
         sender=request.user,
-        notification_type='follow',
-        message=f'{request.user.username} sent you a friend request',
         link=f'/chat/friends/'
     )
-    send_notification_to_user(to_user, notification)
     
     messages.success(request, f"Friend request sent to {to_user.username}!")
     return redirect('chat:friends_list')
@@ -114,14 +137,13 @@ def accept_friend_request(request, request_id):
     friendship.save()
     
     # Create notification
-    notification = Notification.objects.create(
-        recipient=friendship.from_user,
+    notify(
+        friendship.from_user,
+        'follow',
+        f'{request.user.username} accepted your friend request',
         sender=request.user,
-        notification_type='follow',
-        message=f'{request.user.username} accepted your friend request',
         link=f'/chat/friends/'
     )
-    send_notification_to_user(friendship.from_user, notification)
     
     messages.success(request, f"You are now friends with {friendship.from_user.username}!")
     return redirect('chat:friends_list')
@@ -152,38 +174,86 @@ def remove_friend(request, username):
     return redirect('chat:friends_list')
 
 
-@login_required
-def chat_list(request):
-    """List all chat rooms"""
+def build_inbox(user, rooms):
+    """Turn annotated inbox rooms into rows, loading the other users in one query"""
     from types import SimpleNamespace
     
-    rooms = request.user.chat_rooms.annotate(
-        last_message_time=Max('messages__created_at'),
-        unread_count=Count('messages', filter=Q(messages__is_read=False) & ~Q(messages__sender=request.user))
-    ).order_by('-last_message_time')
+    rooms = list(rooms)
+    other_users = User.objects.only('id', 'username', 'profile_picture').in_bulk(
+        [room.other_user_id for room in rooms]
+    )
     
-    # Add other_user to each room
     chat_rooms = []
     for room in rooms:
-        participants = room.participants.exclude(id=request.user.id)
-        if participants.exists():
-            # Create a namespace object to hold room data
-            room_data = SimpleNamespace(
-                id=room.id,
-                other_user=participants.first(),
-                last_message=room.last_message,  # Using the property
-                unread_count=room.unread_count,
-                updated_at=room.updated_at,
+        last_message = None
+        if room.last_message_id:
+            last_message = SimpleNamespace(
+                id=room.last_message_id,
+                content=room.last_message_content,
+                sender_id=room.last_message_sender_id,
+                created_at=room.last_message_time,
             )
-            chat_rooms.append(room_data)
+        chat_rooms.append(SimpleNamespace(
+            id=room.id,
+            other_user=other_users.get(room.other_user_id),
+            last_message=last_message,
+            unread_count=room.unread_count,
+            updated_at=room.updated_at,
+        ))
+    return [room for room in chat_rooms if room.other_user is not None]
+
+
+def inbox_paginator(user):
+    """Keyset paginator over the inbox, most recently active first"""
+    return KeysetPaginator(ChatRoom.inbox_for(user), ['-updated_at', '-id'], per_page=INBOX_PAGE_SIZE, name='inbox')
+
+
+@login_required
+def chat_list(request):
+    """List all chat rooms"""
+    page = inbox_paginator(request.user).get_page()
     
     context = {
-        'chat_rooms': chat_rooms,
+        'chat_rooms': build_inbox(request.user, page.items),
+        'has_more': page.has_more,
+        'next_cursor': page.next_cursor,
     }
     
     return render(request, 'chat/chat_list.html', context)
 
 
+@login_required
+def inbox_api(request):
+    """API endpoint for paginated inbox rows"""
+    try:
+        page = inbox_paginator(request.user).get_page(request.GET.get('cursor'))
+    except InvalidCursor as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    rooms = []
+    for room in build_inbox(request.user, page.items):
+        last_message = room.last_message
+        rooms.append({
+            'id': room.id,
+            'other_user': {
+                'username': room.other_user.username,
+                'profile_picture': room.other_user.profile_picture.url if room.other_user.profile_picture else None,
+            },
+            'last_message': {
+                'content': last_message.content,
+                'is_own': last_message.sender_id == request.user.id,
+                'created_at': last_message.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            } if last_message else None,
+            'unread_count': room.unread_count,
+        })
+    
+    return JsonResponse({
+        'rooms': rooms,
+        'has_more': page.has_more,
+        'next_cursor': page.next_cursor,
+    })
+
+
 @login_required
 def chat_room(request, username):
     """Chat room with a specific user"""
@@ -198,20 +268,44 @@ def chat_room(request, username):
     room = ChatRoom.get_or_create_room(request.user, other_user)
     
     # Mark messages as read
-    room.messages.filter(sender=other_user, is_read=False).update(is_read=True)
+    ChatMembership.mark_read(room.id, request.user.id)
+    
+    # Latest page of messages; older ones are lazy-loaded from message_history_api
+    page = Message.history_paginator(room.id).get_page()
+    chat_messages = page.items[::-1]
     
-    # Get messages
-    chat_messages = room.messages.all()[:50][::-1]  # Last 50 messages, reversed
+    # How far the other participant has read, for "Seen" markers
+    other_last_read_id = room.memberships.filter(user=other_user).values_list('last_read_id', flat=True).first() or 0
     
     context = {
         'room': room,
         'other_user': other_user,
         'messages': chat_messages,
+        'other_last_read_id': other_last_read_id,
+        'has_more': page.has_more,
+        'next_cursor': page.next_cursor,
     }
     
     return render(request, 'chat/chat_room.html', context)
 
 
+@login_required
+def message_history_api(request, room_id):
+    """API endpoint for older messages in a room, oldest first within each page"""
+    room = get_object_or_404(ChatRoom, id=room_id, participants=request.user)
+    
+    try:
+        page = Message.history_paginator(room.id).get_page(request.GET.get('cursor'))
+    except InvalidCursor as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'messages': [message.as_json() for message in reversed(page.items)],
+        'has_more': page.has_more,
+        'next_cursor': page.next_cursor,
+    })
+
+
 @login_required
 def send_message(request, room_id):
     """Send a message via AJAX"""
@@ -220,15 +314,13 @@ def send_message(request, room_id):
         content = request.POST.get('content', '').strip()
         
         if content:
+            # Message.save also bumps the room timestamp
             message = Message.objects.create(
                 room=room,
                 sender=request.user,
                 content=content
             )
             
-            # Update room timestamp
-            room.save()
-            
             return JsonResponse({
                 'success': True,
                 'message': {
@@ -262,39 +354,89 @@ def get_friends_api(request):
 
 @login_required
 def share_pin_api(request):
-    """API endpoint to share a pin with a friend via message"""
+    """
+    API endpoint to share a pin with one or more friends via message.
+    Accepts ``usernames`` (a list) or a single ``username``.
+    """
     if request.method == 'POST':
         import json
         from pins.models import Pin
+        from notifications.dispatch import broadcast
         
         data = json.loads(request.body)
-        username = data.get('username')
+        usernames = data.get('usernames') or [data.get('username')]
+        if not isinstance(usernames, list):
+            return JsonResponse({'success': False, 'error': 'usernames must be a list'}, status=400)
+        usernames = list(dict.fromkeys(name for name in usernames if name and isinstance(name, str)))
+        usernames = usernames[:SHARE_MAX_RECIPIENTS]
+        if not usernames:
+            return JsonResponse({'success': False, 'error': 'No recipients'})
         pin_id = data.get('pin_id')
-        message_text = data.get('message')
         
-        try:
-            friend = User.objects.get(username=username)
-            pin = Pin.objects.get(id=pin_id)
-            
-            # Check if friends
-            if not Friendship.are_friends(request.user, friend):
-                return JsonResponse({'success': False, 'error': 'Not friends'})
-            
-            # Get or create chat room
-            room = ChatRoom.get_or_create_room(request.user, friend)
-            
-            # Send message
-            Message.objects.create(
-                room=room,
-                sender=request.user,
-                content=message_text
-            )
-            
-            return JsonResponse({'success': True})
-        except User.DoesNotExist:
-            return JsonResponse({'success': False, 'error': 'User not found'})
-        except Pin.DoesNotExist:
+        pin = Pin.objects.filter(id=pin_id).first()
+        if pin is None:
             return JsonResponse({'success': False, 'error': 'Pin not found'})
+        
+        # Same rule as the pin detail page: premium-only pins need a premium account
+        if pin.is_premium_only and not request.user.is_premium:
+            return JsonResponse({'success': False, 'error': 'This is a premium-only pin'}, status=403)
+        
+        # One query for the users; friendship is a cached set lookup
+        users = {user.username: user for user in User.objects.filter(username__in=usernames)}
+        friend_ids = FriendEdge.friend_ids(request.user.id)
+        errors = {}
+        recipients = []
+        for username in usernames:
+            user = users.get(username)
+            if user is None:
+                errors[username] = 'User not found'
+            elif user.id not in friend_ids:
+                errors[username] = 'Not friends'
+            else:
+                recipients.append(user)
+        
+        if not recipients:
+            error = errors.get(usernames[0], 'No recipients') if len(usernames) == 1 else 'No recipients'
+            return JsonResponse({'success': False, 'error': error, 'errors': errors})
+        
+        content = (data.get('message') or '').strip() or f'Check out this pin: {pin.title}'
+        try:
+            shared, unread = Message.share_pin(request.user, pin, recipients, content)
+        except ChatRoom.DoesNotExist:
+            return JsonResponse({'success': False, 'error': 'Could not open the chats, please try again'}, status=409)
+        
+        # Realtime fan-out happens in the dispatcher after commit, in one batch
+        events = []
+        for message in shared:
+            events.append((f'chat_{message.room_id}', {
+                'type': 'chat_message',
+                'message': {
+                    'id': message.id,
+                    'content': message.content,
+                    'sender': request.user.username,
+                    'sender_id': request.user.id,
+                    'created_at': message.created_at.strftime('%H:%M'),
+                    'pin': message.pin_preview,
+                }
+            }))
+        for recipient in recipients:
+            events.append((f'notifications_{recipient.id}', {
+                'type': 'send_notification',
+                'notification': {
+                    'type': 'new_message',
+                    'message': f'{request.user.username} shared a pin: {pin.title[:50]}',
+                    'sender': request.user.username,
+                    'link': f'/chat/{request.user.username}/',
+                    'unread_count': unread.get(recipient.id, 0),
+                }
+            }))
+        broadcast(events)
+        
+        return JsonResponse({
+            'success': True,
+            'shared_with': [recipient.username for recipient in recipients],
+            'errors': errors,
+        })
     
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
@@ -302,13 +444,6 @@ def share_pin_api(request):
 @login_required
 def get_unread_count(request):
     """Get total unread message count"""
-    # Get all rooms where user is participant
-    user_rooms = ChatRoom.objects.filter(participants=request.user)
-    
-    # Count unread messages from others
-    unread_count = Message.objects.filter(
-        room__in=user_rooms,
-        is_read=False
-    ).exclude(sender=request.user).count()
+    unread_count = ChatMembership.total_unread(request.user.id)
     
     return JsonResponse({'unread_count': unread_count})
@@ -0,0 +1,29 @@
+"""
+Caching for the explore page's first-page sections.
+
+Anonymous and non-premium viewers all see the same popular/recent/random
+first pages, so those are built once and shared through the cache until the
+TTL expires or a pin is created, edited, deleted or liked (see
+pins.signals).
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+EXPLORE_CACHE_KEY = 'explore:sections:public'
+
+
+def explore_cache_ttl():
+    return getattr(settings, 'EXPLORE_CACHE_TTL', 300)
+
+
+def get_cached_sections():
+    return cache.get(EXPLORE_CACHE_KEY)
+
+
+def set_cached_sections(sections):
+    cache.set(EXPLORE_CACHE_KEY, sections, explore_cache_ttl())
+
+
+def invalidate_explore_cache():
+    """Drop cached explore sections after a pin is created, deleted or liked"""
+    cache.delete(EXPLORE_CACHE_KEY)
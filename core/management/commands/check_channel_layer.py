@@ -0,0 +1,22 @@
+"""
+Management command to verify the channel layer fans out messages
+"""
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from core.realtime import check_channel_layer
+
+
+class Command(BaseCommand):
+    help = 'Round-trip a group message through the configured channel layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=float, default=2.0)
+        parser.add_argument('--receivers', type=int, default=2)
+
+    def handle(self, *args, **options):
+        result = async_to_sync(check_channel_layer)(options['timeout'], options['receivers'])
+        if not result['ok']:
+            raise CommandError(f'{result["backend"]}: {result["error"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {result["backend"]}: {result["receivers"]} receivers in {result["latency_ms"]}ms'
+        ))
@@ -0,0 +1,244 @@
+"""
+Management command to check that the hot query shapes are served by indexes
+
+Creates a throwaway test database, seeds it with a synthetic dataset, then
+runs EXPLAIN on each query the feeds, chat, notifications and friend views
+issue and fails if any of them scans a whole table. The keyset-paginated
+feeds must also come back in index order: an extra sort there is a failure.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F
+from boards.models import Board
+from chat.models import ChatMembership, ChatRoom, FriendEdge, FriendSuggestion, Friendship, Message
+from notifications.models import Notification
+from pins.models import Comment, Pin
+from users.models import EmailOTP, User, UserSearchToken
+from users.search import tokens_with_prefix
+
+
+class Command(BaseCommand):
+    help = 'Seed a test database and assert the hot queries use indexes (EXPLAIN)'
+
+    # Keyset feeds, read in index order page after page; a sort fails them
+    INDEX_ORDERED = {
+        'Recent pins feed', 'Public recent pins feed', 'Popular pins feed', 'Public popular pins feed',
+        'Board pins', 'Room history', 'Room history backfill',
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help='Rows seeded into each large table')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the test database between runs')
+        parser.add_argument('--show-plans', action='store_true', help='Print every plan, not just failures')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            failures = self.run_checks(options['rows'], options['show_plans'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        if failures:
+            raise CommandError(f'{failures} hot queries fall back to a full table scan or an extra sort')
+        self.stdout.write(self.style.SUCCESS('✓ All hot queries use an index'))
+
+    def run_checks(self, rows, show_plans=False):
+        """Seed the current database, EXPLAIN every hot query and return the number of full scans"""
+        started = time.monotonic()
+        ids = self.seed(rows)
+        self.analyze()
+        self.stdout.write(f'Seeded {rows} rows per table in {time.monotonic() - started:.1f}s ({connection.vendor})')
+        return self.check_queries(self.hot_queries(ids), show_plans)
+
+    def hot_queries(self, ids):
+        """The query shapes issued on every page view / websocket event"""
+        user_id, room_id, board_id, pin_id = ids['user'], ids['room'], ids['board'], ids['pin']
+        return [
+            ('Recent pins feed', Pin.objects.order_by('-created_at', '-id')[:21]),
+            ('Public recent pins feed', Pin.objects.filter(is_premium_only=False).order_by('-created_at', '-id')[:21]),
+            ('Popular pins feed', Pin.objects.filter(like_count__gt=0).order_by('-like_count', '-id')[:21]),
+            ('Public popular pins feed',
+             Pin.objects.filter(is_premium_only=False, like_count__gt=0).order_by('-like_count', '-id')[:21]),
+            ('Board pins', Pin.objects.filter(board_id=board_id).order_by('-created_at')[:50]),
+            ('Pin comments', Comment.objects.filter(pin_id=pin_id, parent__isnull=True).order_by('created_at')),
+            ('Room for user pair', ChatRoom.objects.filter(pair_key=ChatRoom.pair_key_for(user_id, ids['peer']))),
+            ('Unread messages in room', ChatMembership.unread_after(room_id, user_id, ids['last_read'])),
+            ('Inbox', ChatRoom.inbox_for(User.objects.get(pk=user_id)).order_by('-updated_at', '-id')[:31]),
+            ('Room history', Message.objects.filter(room_id=room_id).order_by('-created_at')[:50]),
+            ('Room history backfill', Message.objects.filter(room_id=room_id, id__lt=ids['last_read']).order_by('-id')[:31]),
+            ('Unread notifications',
+             Notification.objects.filter(recipient_id=user_id, is_read=False).order_by('-created_at')[:5]),
+            ('Incoming friend requests', Friendship.objects.filter(to_user_id=user_id, status='pending')),
+            ('Outgoing friend requests', Friendship.objects.filter(from_user_id=user_id, status='pending')),
+            ('Friend ids', FriendEdge.objects.filter(user_id=user_id).values_list('friend_id', flat=True)),
+            ('Friend suggestions', FriendSuggestion.objects.filter(user_id=user_id).order_by('-score')[:20]),
+            ('User search prefix', tokens_with_prefix('seed12').values('user_id')),
+            ('Latest OTP for email',
+             EmailOTP.objects.filter(email=ids['email'], is_verified=False).order_by('-created_at')[:1]),
+        ]
+
+    def check_queries(self, queries, show_plans):
+        failures = 0
+        for label, queryset in queries:
+            plan, full_scan, warnings = self.explain(queryset)
+            unordered = bool(warnings) and label in self.INDEX_ORDERED
+            if full_scan or unordered:
+                failures += 1
+                problem = 'full table scan' if full_scan else ', '.join(warnings)
+                self.stdout.write(self.style.ERROR(f'✗ {label}: {problem}'))
+            elif warnings:
+                self.stdout.write(self.style.WARNING(f'⚠ {label}: {", ".join(warnings)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✓ {label}'))
+            if full_scan or unordered or show_plans:
+                for line in plan:
+                    self.stdout.write(f'    {line}')
+        return failures
+
+    def explain(self, queryset):
+        """Return ``(plan lines, full_scan, warnings)`` for the database in use"""
+        sql, params = queryset.query.sql_with_params()
+        vendor = connection.vendor
+
+        with connection.cursor() as cursor:
+            if vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = [row[-1] for row in cursor.fetchall()]
+                full_scan = any(line.startswith('SCAN') and 'USING' not in line for line in plan)
+                warnings = ['temporary sort'] if any('TEMP B-TREE' in line for line in plan) else []
+            elif vendor == 'mysql':
+                cursor.execute(f'EXPLAIN {sql}', params)
+                columns = [column[0] for column in cursor.description]
+                rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                plan = [f'{row["table"]}: type={row["type"]} key={row["key"]} {row["Extra"] or ""}' for row in rows]
+                full_scan = any(row['type'] == 'ALL' for row in rows)
+                warnings = ['filesort'] if any('filesort' in (row['Extra'] or '') for row in rows) else []
+            else:
+                cursor.execute(f'EXPLAIN {sql}', params)
+                plan = [row[0] for row in cursor.fetchall()]
+                full_scan = any('Seq Scan' in line for line in plan)
+                warnings = []
+        return plan, full_scan, warnings
+
+    def analyze(self):
+        """Refresh planner statistics so plans reflect the seeded data"""
+        tables = [model._meta.db_table for model in (
+            Pin, Comment, ChatRoom, ChatRoom.participants.through, Message, Notification, Friendship, EmailOTP
+        )]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute(f'ANALYZE TABLE {", ".join(tables)}')
+                cursor.fetchall()
+            else:
+                cursor.execute('ANALYZE')
+
+    def seed(self, rows):
+        """Bulk-insert a synthetic dataset and return ids to plug into the queries"""
+        user_count = max(rows // 20, 50)
+
+        User.objects.bulk_create(
+            [User(username=f'seed{i}', email=f'seed{i}@example.com', password='!') for i in range(user_count)],
+            batch_size=1000
+        )
+        user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+        UserSearchToken.objects.bulk_create(
+            [UserSearchToken(user_id=user_id, token=f'seed{i}') for i, user_id in enumerate(user_ids)],
+            batch_size=1000
+        )
+
+        Board.objects.bulk_create(
+            [Board(user_id=user_id, title='Seed board') for user_id in user_ids],
+            batch_size=1000
+        )
+        board_ids = list(Board.objects.order_by('pk').values_list('pk', flat=True))
+
+        Pin.objects.bulk_create(
+            [Pin(
+                user_id=user_ids[i % user_count],
+                board_id=board_ids[i % user_count],
+                title=f'Seed pin {i}',
+                image='pins/seed.jpg',
+                is_premium_only=i % 10 == 0,
+            ) for i in range(rows)],
+            batch_size=1000
+        )
+        pin_ids = list(Pin.objects.order_by('pk').values_list('pk', flat=True))
+        # A long tail: most pins have no likes, a few have many
+        Pin.objects.filter(pk__in=pin_ids[::10]).update(like_count=F('id') % 500 + 1)
+
+        Comment.objects.bulk_create(
+            [Comment(pin_id=pin_ids[i % len(pin_ids)], user_id=user_ids[i % user_count], text='Seed comment')
+             for i in range(rows)],
+            batch_size=1000
+        )
+
+        # Each user is friends with the next few users
+        Friendship.objects.bulk_create(
+            [Friendship(
+                from_user_id=user_ids[i],
+                to_user_id=user_ids[(i + offset) % user_count],
+                status='accepted' if offset < 4 else 'pending',
+            ) for i in range(user_count) for offset in range(1, 6)],
+            batch_size=1000
+        )
+        FriendEdge.objects.bulk_create(
+            [FriendEdge(user_id=user_ids[a], friend_id=user_ids[b])
+             for i in range(user_count) for offset in range(1, 5)
+             for a, b in ((i, (i + offset) % user_count), ((i + offset) % user_count, i))],
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+
+        ChatRoom.objects.bulk_create(
+            [ChatRoom(pair_key=ChatRoom.pair_key_for(user_ids[i], user_ids[(i + 1) % user_count]))
+             for i in range(user_count)],
+            batch_size=1000
+        )
+        room_ids = list(ChatRoom.objects.order_by('pk').values_list('pk', flat=True))
+        ChatRoom.participants.through.objects.bulk_create(
+            [ChatRoom.participants.through(chatroom_id=room_id, user_id=user_ids[(i + offset) % user_count])
+             for i, room_id in enumerate(room_ids) for offset in (0, 1)],
+            batch_size=1000
+        )
+        Message.objects.bulk_create(
+            [Message(
+                room_id=room_ids[i % user_count],
+                # Alternate between the room's two participants
+                sender_id=user_ids[(i % user_count + i // user_count % 2) % user_count],
+                content='Seed message',
+            ) for i in range(rows)],
+            batch_size=1000
+        )
+
+        Notification.objects.bulk_create(
+            [Notification(
+                recipient_id=user_ids[i % user_count],
+                sender_id=user_ids[(i + 1) % user_count],
+                notification_type='like',
+                message='Seed notification',
+                is_read=i < rows * 0.9,
+            ) for i in range(rows)],
+            batch_size=1000
+        )
+
+        EmailOTP.objects.bulk_create(
+            [EmailOTP(email=f'seed{i % user_count}@example.com', otp='000000', user_data={}, is_verified=i % 3 == 0)
+             for i in range(rows)],
+            batch_size=1000
+        )
+
+        middle = user_count // 2
+        # Leave the newest tenth of the room's history unread
+        room_message_ids = list(Message.objects.filter(room_id=room_ids[middle]).order_by('id').values_list('id', flat=True))
+        return {
+            'last_read': room_message_ids[len(room_message_ids) * 9 // 10] if room_message_ids else 0,
+            'user': user_ids[middle],
+            'peer': user_ids[(middle + 1) % user_count],
+            'email': f'seed{middle}@example.com',
+            'room': room_ids[middle],
+            'board': board_ids[middle],
+            'pin': pin_ids[len(pin_ids) // 2],
+        }
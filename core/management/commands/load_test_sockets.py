@@ -0,0 +1,200 @@
+"""
+Management command to load test the chat websocket data paths in-process
+
+Creates a throwaway test database, seeds one chat room per socket, then opens
+``--sockets`` concurrent WebsocketCommunicators against ChatConsumer. Each
+socket alternates between sending a message (waiting for its echo) and
+backfilling history. The same workload runs twice: once against a consumer
+that makes a separate database_sync_to_async hop for every query (how the
+consumer used to work) and once against ChatConsumer, which runs each
+handler's queries in a single hop, and messages/sec and latency percentiles
+are reported for both.
+"""
+import asyncio
+import json
+import time
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import re_path
+from chat.consumers import ChatConsumer
+from chat.models import ChatMembership, ChatRoom, Message
+from users.models import User
+
+
+class PerQueryHopChatConsumer(ChatConsumer):
+    """ChatConsumer with one database_sync_to_async hop per query (the baseline)"""
+
+    async def join_room(self):
+        participant_ids = await self.get_participant_ids()
+        if self.user.id not in participant_ids:
+            return participant_ids, None
+        return participant_ids, await self.mark_messages_read()
+
+    async def save_message(self, content):
+        message = await self.insert_message(content)
+        if self.recipient_id:
+            message['recipient_unread'] = await self.get_unread_count_for_user(self.recipient_id)
+        return message
+
+    @database_sync_to_async
+    def get_participant_ids(self):
+        return list(
+            ChatRoom.participants.through.objects.filter(chatroom_id=self.room_id).values_list('user_id', flat=True)
+        )
+
+    @database_sync_to_async
+    def insert_message(self, content):
+        message = Message(room_id=self.room_id, sender=self.user, content=content)
+        message.save(recipient_ids=self.recipient_ids)
+        return {
+            'id': message.id,
+            'content': message.content,
+            'sender': self.user.username,
+            'sender_id': self.user.id,
+            'created_at': message.created_at.strftime('%H:%M'),
+            'recipient_unread': 0
+        }
+
+    @database_sync_to_async
+    def get_unread_count_for_user(self, user_id):
+        return ChatMembership.total_unread(user_id)
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = 'Open N concurrent chat sockets in-process and compare per-query vs batched thread hops'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sockets', type=int, default=200, help='Concurrent websocket connections')
+        parser.add_argument('--rounds', type=int, default=20, help='Message + backfill rounds per socket')
+        parser.add_argument('--history', type=int, default=100, help='Messages seeded into each room')
+        parser.add_argument('--timeout', type=float, default=10.0, help='Seconds to wait for each reply')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the test database between runs')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            rooms = self.seed(options['sockets'], options['history'])
+            self.stdout.write(f'Seeded {len(rooms)} rooms with {options["history"]} messages each '
+                              f'({connection.vendor})')
+
+            results = {}
+            for label, consumer in (('per query', PerQueryHopChatConsumer), ('batched', ChatConsumer)):
+                results[label] = async_to_sync(self.run_load)(consumer, rooms, options)
+                self.report(label, results[label])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        failed = sum(result['errors'] for result in results.values())
+        if failed:
+            raise CommandError(f'{failed} sockets failed or timed out')
+
+        before, after = results['per query'], results['batched']
+        if before['rate']:
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ batched hops: {after["rate"] / before["rate"]:.2f}x messages/sec, '
+                f'p99 {before["p99"]:.1f}ms -> {after["p99"]:.1f}ms'
+            ))
+
+    def seed(self, sockets, history):
+        """One room per socket, shared with a peer who stays offline; returns (user_id, room_id) pairs"""
+        User.objects.bulk_create(
+            [User(username=f'load{i}', email=f'load{i}@example.com') for i in range(sockets * 2)],
+            batch_size=1000
+        )
+        user_ids = list(User.objects.filter(username__startswith='load').order_by('pk').values_list('pk', flat=True))
+
+        ChatRoom.objects.bulk_create([ChatRoom() for _ in range(sockets)], batch_size=1000)
+        room_ids = list(ChatRoom.objects.order_by('-pk').values_list('pk', flat=True)[:sockets])
+        pairs = [(user_ids[2 * i], user_ids[2 * i + 1], room_id) for i, room_id in enumerate(room_ids)]
+
+        ChatRoom.participants.through.objects.bulk_create(
+            [ChatRoom.participants.through(chatroom_id=room_id, user_id=user_id)
+             for user_id, peer_id, room_id in pairs for user_id in (user_id, peer_id)],
+            batch_size=1000
+        )
+        ChatMembership.objects.bulk_create(
+            [ChatMembership(room_id=room_id, user_id=user_id)
+             for user_id, peer_id, room_id in pairs for user_id in (user_id, peer_id)],
+            batch_size=1000
+        )
+        Message.objects.bulk_create(
+            [Message(room_id=room_id, sender_id=peer_id, content=f'Seed message {n}')
+             for user_id, peer_id, room_id in pairs for n in range(history)],
+            batch_size=1000
+        )
+        return [(user_id, room_id) for user_id, peer_id, room_id in pairs]
+
+    async def run_load(self, consumer, rooms, options):
+        application = URLRouter([re_path(r'ws/chat/(?P<room_id>\d+)/$', consumer.as_asgi())])
+        users = await User.objects.ain_bulk([user_id for user_id, room_id in rooms])
+        latencies = []
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(
+            *(self.run_socket(application, users[user_id], room_id, options, latencies)
+              for user_id, room_id in rooms),
+            return_exceptions=True
+        )
+        elapsed = time.perf_counter() - started
+
+        return {
+            'sockets': len(rooms),
+            'errors': sum(1 for outcome in outcomes if isinstance(outcome, BaseException)),
+            'requests': len(latencies),
+            'elapsed': elapsed,
+            'rate': len(latencies) / elapsed if elapsed else 0.0,
+            'p50': percentile(latencies, 50),
+            'p99': percentile(latencies, 99),
+        }
+
+    async def run_socket(self, application, user, room_id, options, latencies):
+        communicator = WebsocketCommunicator(application, f'/ws/chat/{room_id}/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect(timeout=options['timeout'])
+        if not connected:
+            raise RuntimeError(f'room {room_id}: connection refused')
+
+        try:
+            cursor = None
+            for n in range(options['rounds']):
+                await self.request(communicator, {'message': f'Load message {n}'}, 'message', options, latencies)
+                reply = await self.request(
+                    communicator, {'action': 'load_before', 'cursor': cursor}, 'history', options, latencies
+                )
+                cursor = reply['next_cursor']
+        finally:
+            await communicator.disconnect()
+
+    async def request(self, communicator, payload, expect, options, latencies):
+        """Send a frame and wait for the reply of type ``expect``, skipping read receipts along the way"""
+        started = time.perf_counter()
+        await communicator.send_to(text_data=json.dumps(payload))
+        while True:
+            reply = json.loads(await communicator.receive_from(timeout=options['timeout']))
+            if reply['type'] == expect:
+                latencies.append((time.perf_counter() - started) * 1000)
+                return reply
+            if reply['type'] == 'error':
+                raise RuntimeError(reply['error'])
+
+    def report(self, label, result):
+        line = (f'{label:>10}: {result["sockets"]} sockets, {result["requests"]} requests in '
+                f'{result["elapsed"]:.2f}s = {result["rate"]:.0f} msg/s, '
+                f'p50 {result["p50"]:.1f}ms, p99 {result["p99"]:.1f}ms')
+        if result['errors']:
+            self.stdout.write(self.style.ERROR(f'{line} ({result["errors"]} sockets failed)'))
+        else:
+            self.stdout.write(line)
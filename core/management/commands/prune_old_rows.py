@@ -0,0 +1,49 @@
+"""
+Management command to delete (or archive) expired and old rows
+
+Applies the retention policies in core.retention: read and very old
+notifications, expired OTPs and password reset tokens, and chat messages when
+CHAT_MESSAGE_RETENTION_DAYS is set. Deletes go one primary-key range at a
+time. Run it from cron, or keep it running with --every.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from core.retention import run_retention
+
+
+class Command(BaseCommand):
+    help = 'Delete rows past their retention period in bounded primary-key batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Primary-key range deleted per statement')
+        parser.add_argument('--archive-dir', help='Append archivable rows to JSONL files here before deleting')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep after each non-empty batch')
+        parser.add_argument('--dry-run', action='store_true', help='Count expired rows without deleting')
+        parser.add_argument('--every', type=int, default=0, help='Repeat every N seconds instead of running once')
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options)
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+
+    def run_once(self, options):
+        verb = 'would delete' if options['dry_run'] else 'deleted'
+        results = run_retention(
+            batch_size=options['batch_size'],
+            archive_dir=options['archive_dir'],
+            dry_run=options['dry_run'],
+            pause=options['pause'],
+        )
+        if not results:
+            self.stdout.write(self.style.WARNING('No retention policies are enabled'))
+            return
+
+        total = 0
+        for label, rows, seconds in results:
+            total += rows
+            rate = rows / seconds if seconds else 0
+            self.stdout.write(f'{label}: {verb} {rows} rows in {seconds:.1f}s ({rate:.0f} rows/s)')
+        self.stdout.write(self.style.SUCCESS(f'✓ {verb} {total} rows'))
@@ -0,0 +1,29 @@
+"""
+Management command to recompute the precomputed friend suggestions.
+Run it periodically (e.g. nightly from cron); new friendships and requests
+remove affected suggestions immediately in between.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from chat.suggestions import rebuild_all, rebuild_suggestions
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Rank friend suggestions by mutual friends and shared liked pins'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Users recomputed per batch')
+        parser.add_argument('--user', action='append', default=[], help='Only rebuild for these usernames')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['user']:
+            user_ids = list(User.objects.filter(username__in=options['user']).values_list('pk', flat=True))
+            users, rows = len(user_ids), rebuild_suggestions(user_ids)
+        else:
+            users, rows = rebuild_all(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {rows} suggestions for {users} users in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,84 @@
+"""
+Management command to recount chat and notification unread counters
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from chat.models import ChatMembership, Message
+from core.utils import pk_ranges
+from notifications.models import Notification, UnreadNotificationCounter
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Recount unread chat messages and notifications and fix drifted counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Primary-key range processed per query')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        verb = 'would fix' if dry_run else 'fixed'
+
+        checked, fixed = self.repair_chat(batch_size, dry_run)
+        style = self.style.WARNING if fixed else self.style.SUCCESS
+        self.stdout.write(style(f'Chat memberships: checked {checked}, {verb} {fixed}'))
+
+        checked, fixed = self.repair_notifications(batch_size, dry_run)
+        style = self.style.WARNING if fixed else self.style.SUCCESS
+        self.stdout.write(style(f'Notification counters: checked {checked}, {verb} {fixed}'))
+
+    def repair_chat(self, batch_size, dry_run):
+        checked = fixed = 0
+        for start, end in pk_ranges(ChatMembership, batch_size):
+            # Messages after each member's read watermark, counted per membership
+            unread = (
+                Message.objects.filter(room_id=OuterRef('room_id'), id__gt=OuterRef('last_read_id'))
+                .exclude(sender_id=OuterRef('user_id'))
+                .order_by()
+                .values('room_id')
+                .annotate(n=Count('id'))
+                .values('n')
+            )
+            memberships = ChatMembership.objects.filter(pk__gte=start, pk__lt=end).annotate(
+                actual=Coalesce(Subquery(unread), 0)
+            )
+
+            drifted = []
+            for membership in memberships:
+                checked += 1
+                actual = membership.actual
+                if membership.unread_count != actual:
+                    membership.unread_count = actual
+                    drifted.append(membership)
+
+            fixed += len(drifted)
+            if drifted and not dry_run:
+                ChatMembership.objects.bulk_update(drifted, ['unread_count'])
+                ChatMembership.invalidate([membership.user_id for membership in drifted])
+        return checked, fixed
+
+    def repair_notifications(self, batch_size, dry_run):
+        checked = fixed = 0
+        for start, end in pk_ranges(User, batch_size):
+            stored = dict(
+                UnreadNotificationCounter.objects.filter(user_id__gte=start, user_id__lt=end)
+                .values_list('user_id', 'count')
+            )
+            actual = dict(
+                Notification.objects.filter(recipient_id__gte=start, recipient_id__lt=end, is_read=False)
+                .order_by()
+                .values('recipient_id')
+                .annotate(n=Count('id'))
+                .values_list('recipient_id', 'n')
+            )
+
+            for user_id in stored.keys() | actual.keys():
+                checked += 1
+                if stored.get(user_id, 0) != actual.get(user_id, 0):
+                    fixed += 1
+                    if not dry_run:
+                        UnreadNotificationCounter.reset(user_id, actual.get(user_id, 0))
+        return checked, fixed
@@ -0,0 +1,17 @@
+"""
+Management command to rebuild the shuffled pin sample behind explore's random section.
+Run it periodically (e.g. hourly from cron) so the random feed keeps changing.
+"""
+from django.core.management.base import BaseCommand
+from core.sampling import rebuild_sample
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the pre-shuffled random pin sample used by the explore page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=None, help='Number of pins to sample (defaults to EXPLORE_RANDOM_SAMPLE_SIZE)')
+
+    def handle(self, *args, **options):
+        count = rebuild_sample(options['size'])
+        self.stdout.write(self.style.SUCCESS(f'Sampled {count} pins for the random explore feed'))
@@ -0,0 +1,35 @@
+"""
+Management command to serve an in-process fake Redis over TCP.
+
+Lets CI run several Daphne/worker processes against one shared channel layer
+without a real Redis server: start this, point CHANNEL_REDIS_URL at it and
+exercise cross-process fan-out. Needs the optional ``fakeredis`` package.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Serve a fake Redis on a TCP port for multi-process channel layer tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=6390)
+
+    def handle(self, *args, **options):
+        try:
+            from fakeredis import TcpFakeServer
+        except ImportError:
+            raise CommandError('fakeredis>=2.26 is required: pip install "fakeredis[lua]"')
+
+        address = (options['host'], options['port'])
+        server = TcpFakeServer(address, server_type='redis')
+        self.stdout.write(self.style.SUCCESS(
+            f'Fake Redis listening on redis://{address[0]}:{address[1]}/0 (Ctrl+C to stop)'
+        ))
+        self.stdout.write(f'Use: CHANNEL_REDIS_URL=redis://{address[0]}:{address[1]}/0')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
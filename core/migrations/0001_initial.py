@@ -0,0 +1,27 @@
+# Generated by Django 5.1.13 on 2026-10-17 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('pins', '0007_pin_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RandomPinSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(unique=True)),
+                ('pin', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='random_sample', to='pins.pin')),
+            ],
+            options={
+                'ordering': ['position'],
+            },
+        ),
+    ]
@@ -1,3 +1,46 @@
 from django.db import models
 
-# Create your models here.
+
+class CounterFieldsMixin:
+    """
+    Stop ``save()`` from writing denormalized counters back to the database.
+
+    Counters are only ever changed with ``F()`` updates, so an instance that
+    was loaded a moment ago holds a possibly stale value; saving it with a
+    full ``UPDATE`` would silently undo concurrent increments.
+    """
+    counter_fields = ()
+    # Other columns only written by targeted updates (e.g. from background
+    # workers), which a full save would overwrite the same way
+    background_fields = ()
+    
+    def save(self, *args, **kwargs):
+        skipped = tuple(self.counter_fields) + tuple(self.background_fields)
+        if not self._state.adding and kwargs.get('update_fields') is None and skipped:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+
+class RandomPinSample(models.Model):
+    """
+    Pre-shuffled sample of pins for the explore "random" section.
+    
+    Rebuilt periodically by the ``reshuffle_explore_sample`` command so the
+    explore page reads a contiguous range of positions off an index instead
+    of asking the database to ``ORDER BY RAND()`` the whole pins table.
+    """
+    position = models.PositiveIntegerField(unique=True)
+    pin = models.OneToOneField(
+        'pins.Pin',
+        on_delete=models.CASCADE,
+        related_name='random_sample'
+    )
+    
+    class Meta:
+        ordering = ['position']
+    
+    def __str__(self):
+        return f"#{self.position}: {self.pin_id}"
@@ -0,0 +1,105 @@
+"""
+Keyset (cursor) pagination for the pin feeds.
+
+Instead of ``OFFSET`` slicing, each page continues from the sort key of the
+last row of the previous page, so every page costs the same index range scan
+and rows inserted while a user scrolls never shift the page boundaries.
+"""
+from datetime import datetime
+
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_SALT = 'core.pagination.cursor'
+
+
+class InvalidCursor(Exception):
+    """Raised when a cursor was tampered with or belongs to another feed"""
+
+
+class KeysetPage:
+    """A single page of results plus the cursor for the next one"""
+
+    def __init__(self, items, has_more, next_cursor):
+        self.items = items
+        self.has_more = has_more
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset on a unique, ordered tuple of keys.
+
+    ``ordering`` is a list like ``['-created_at', '-id']``; the last key must
+    be unique (normally the primary key) so that ties are broken
+    deterministically. Cursors are signed so clients can't forge arbitrary
+    key values, and they carry the feed name so a cursor from one feed is
+    rejected by another.
+    """
+
+    def __init__(self, queryset, ordering, per_page=20, name='feed'):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+        self.name = name
+
+    def _fields(self):
+        return [key.lstrip('-') for key in self.ordering]
+
+    def encode_cursor(self, obj):
+        """Build an opaque cursor pointing just after ``obj``"""
+        values = []
+        for field in self._fields():
+            value = getattr(obj, field)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            values.append(value)
+        return signing.dumps({'f': self.name, 'v': values}, salt=CURSOR_SALT)
+
+    def decode_cursor(self, cursor):
+        """Return the key values stored in ``cursor``"""
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            raise InvalidCursor('Invalid cursor')
+
+        if not isinstance(data, dict) or data.get('f') != self.name:
+            raise InvalidCursor('Cursor does not match this feed')
+
+        values = data.get('v')
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise InvalidCursor('Cursor does not match this feed')
+        return values
+
+    def _seek_filter(self, values):
+        """
+        Build ``(k1 < v1) OR (k1 = v1 AND k2 < v2) OR ...`` honouring the
+        direction of each key.
+        """
+        condition = Q()
+        equal_prefix = {}
+        for key, value in zip(self.ordering, values):
+            field = key.lstrip('-')
+            lookup = 'lt' if key.startswith('-') else 'gt'
+            condition |= Q(**equal_prefix, **{f'{field}__{lookup}': value})
+            equal_prefix[field] = value
+        return condition
+
+    def get_page(self, cursor=None):
+        """Fetch the page following ``cursor`` (or the first page)"""
+        queryset = self.queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self._seek_filter(self.decode_cursor(cursor)))
+
+        # Fetch one extra row to find out whether another page exists
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        items = rows[:self.per_page]
+        next_cursor = self.encode_cursor(items[-1]) if has_more else None
+        return KeysetPage(items, has_more, next_cursor)
@@ -0,0 +1,53 @@
+"""
+Channel layer health checks.
+
+A round trip through the layer's group fan-out proves the realtime path works
+end to end: with ``channels_redis`` the message really goes through Redis, so
+this catches a dead or unreachable Redis before users notice missing chat
+messages and notifications.
+"""
+import asyncio
+import time
+
+from channels.layers import get_channel_layer
+
+HEALTH_GROUP = 'health_check'
+
+
+async def check_channel_layer(timeout=2.0, receivers=2):
+    """
+    Add ``receivers`` fresh channels to a group, ``group_send`` one message
+    and wait until each of them receives it. Returns a result dict.
+    """
+    layer = get_channel_layer()
+    if layer is None:
+        return {'ok': False, 'backend': None, 'error': 'CHANNEL_LAYERS is not configured'}
+
+    backend = f'{type(layer).__module__}.{type(layer).__name__}'
+    channels = [await layer.new_channel() for _ in range(receivers)]
+    started = time.perf_counter()
+    try:
+        for channel in channels:
+            await layer.group_add(HEALTH_GROUP, channel)
+        await layer.group_send(HEALTH_GROUP, {'type': 'health.ping', 'sent_at': started})
+        await asyncio.wait_for(
+            asyncio.gather(*(layer.receive(channel) for channel in channels)),
+            timeout
+        )
+    except asyncio.TimeoutError:
+        return {'ok': False, 'backend': backend, 'error': f'No fan-out within {timeout}s'}
+    except Exception as e:
+        return {'ok': False, 'backend': backend, 'error': str(e)}
+    finally:
+        for channel in channels:
+            try:
+                await layer.group_discard(HEALTH_GROUP, channel)
+            except Exception:
+                pass
+
+    return {
+        'ok': True,
+        'backend': backend,
+        'receivers': receivers,
+        'latency_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
@@ -0,0 +1,108 @@
+"""
+Retention for tables that otherwise grow forever.
+
+Each policy names a model, a filter selecting its expired rows and whether
+rows are archived before they go. ``run_retention`` walks every table in
+primary-key ranges and deletes the expired rows of one range per statement,
+so no delete holds locks on more than ``batch_size`` keys and the work can be
+spread out with a pause between batches. Call it from the
+``prune_old_rows`` management command, cron or any periodic task runner.
+
+Retention periods come from settings; a period of 0 disables that policy.
+"""
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import serializers
+from django.db.models import Q
+from django.utils import timezone
+
+from .utils import pk_ranges
+
+
+def retention_policies(now=None):
+    """``(label, model, condition, archive)`` for each enabled policy"""
+    from chat.models import Message
+    from notifications.models import Notification
+    from users.models import EmailOTP, PasswordResetToken
+
+    now = now or timezone.now()
+    policies = []
+
+    days = settings.READ_NOTIFICATION_RETENTION_DAYS
+    if days:
+        policies.append(('read notifications', Notification,
+                         Q(is_read=True, created_at__lt=now - timedelta(days=days)), True))
+    days = settings.NOTIFICATION_RETENTION_DAYS
+    if days:
+        # Unread ones too; the queryset's delete keeps the unread counters right
+        policies.append(('old notifications', Notification, Q(created_at__lt=now - timedelta(days=days)), True))
+
+    hours = settings.EMAIL_OTP_RETENTION_HOURS
+    if hours:
+        # Codes are only valid for minutes; never archived, they hold registration data
+        policies.append(('email OTPs', EmailOTP, Q(created_at__lt=now - timedelta(hours=hours)), False))
+
+    days = settings.PASSWORD_RESET_RETENTION_DAYS
+    if days:
+        policies.append(('password reset tokens', PasswordResetToken,
+                         Q(created_at__lt=now - timedelta(days=days)), False))
+
+    days = settings.CHAT_MESSAGE_RETENTION_DAYS
+    if days:
+        policies.append(('chat messages', Message, Q(created_at__lt=now - timedelta(days=days)), True))
+
+    return policies
+
+
+def archive_rows(archive_dir, label, queryset):
+    """Append the rows to ``<archive_dir>/<label>.jsonl`` (one JSON object per row)"""
+    path = os.path.join(archive_dir, f'{label.replace(" ", "_")}.jsonl')
+    data = serializers.serialize('jsonl', queryset)
+    if data:
+        with open(path, 'a', encoding='utf-8') as archive:
+            archive.write(data if data.endswith('\n') else data + '\n')
+
+
+def prune(label, model, condition, archive, batch_size=1000, archive_dir=None, dry_run=False, pause=0.0):
+    """
+    Delete ``model`` rows matching ``condition`` one primary-key range at a
+    time. Returns ``(rows, seconds)``.
+    """
+    from chat.models import ChatMembership, Message
+    
+    started = time.monotonic()
+    rows = 0
+    for start, end in pk_ranges(model, batch_size):
+        expired = model.objects.filter(condition, pk__gte=start, pk__lt=end)
+        if dry_run:
+            rows += expired.count()
+            continue
+
+        if archive and archive_dir:
+            archive_rows(archive_dir, label, expired.order_by('pk'))
+        # Deleted chat messages may still be counted as unread
+        room_ids = set(expired.values_list('room_id', flat=True).distinct()) if model is Message else ()
+        # The default manager's delete, so custom querysets (notification
+        # counters) and cascades still apply
+        _, per_model = expired.delete()
+        if room_ids:
+            ChatMembership.recount_unread(room_ids)
+        deleted = per_model.get(model._meta.label, 0)
+        rows += deleted
+        if pause and deleted:
+            time.sleep(pause)
+    return rows, time.monotonic() - started
+
+
+def run_retention(batch_size=1000, archive_dir=None, dry_run=False, pause=0.0, now=None):
+    """Apply every enabled retention policy; returns ``[(label, rows, seconds), ...]``"""
+    if archive_dir:
+        os.makedirs(archive_dir, exist_ok=True)
+    results = []
+    for label, model, condition, archive in retention_policies(now):
+        rows, seconds = prune(label, model, condition, archive, batch_size, archive_dir, dry_run, pause)
+        results.append((label, rows, seconds))
+    return results
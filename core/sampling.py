@@ -0,0 +1,145 @@
+"""
+Random pin sampling for the explore page without ``ORDER BY RAND()``.
+
+Each visit gets a seed that picks a starting position in the pre-shuffled
+``RandomPinSample`` table; page N reads the next window of positions, so
+infinite scroll walks the sample without repeats and every page is an index
+range scan. If the sample hasn't been built yet we fall back to probing
+random primary keys.
+"""
+import random
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from pins.models import Pin
+
+from .models import RandomPinSample
+
+SESSION_KEY = 'explore_random_seed'
+
+# Most pins the probing fallback serves before it reports the end of the
+# feed (later pages read further along the pk index with an OFFSET)
+MAX_PROBED_PINS = 500
+
+
+def parse_seed(value):
+    """A seed passed back by the client, or None if it isn't a valid one"""
+    try:
+        seed = int(value)
+    except (TypeError, ValueError):
+        return None
+    return seed if 0 <= seed < 2 ** 31 else None
+
+
+def get_session_seed(request, seed=None):
+    """
+    Return the random feed's seed for this request. ``seed`` (or the
+    ``seed`` query parameter the infinite-scroll requests carry) wins.
+    Logged-in users otherwise keep theirs in the session, which is only
+    written when the stored seed changes; anonymous visitors get a fresh
+    seed without a session being created for them.
+    """
+    if seed is None:
+        seed = parse_seed(request.GET.get('seed'))
+    if not request.user.is_authenticated:
+        return seed if seed is not None else random.randrange(2 ** 31)
+
+    stored = request.session.get(SESSION_KEY)
+    if seed is None:
+        seed = stored if stored is not None else random.randrange(2 ** 31)
+    if seed != stored:
+        request.session[SESSION_KEY] = seed
+    return seed
+
+
+def sample_size():
+    """Number of positions in the shuffled sample (deleted pins leave gaps)"""
+    last = RandomPinSample.objects.aggregate(last=Max('position'))['last']
+    return 0 if last is None else last + 1
+
+
+def random_page(queryset, seed, page=1, per_page=20):
+    """
+    Return ``(pins, has_more)`` for page ``page`` of the random feed.
+
+    ``queryset`` carries viewer filtering (premium etc.), so a window may
+    yield fewer than ``per_page`` pins, but consecutive pages never overlap.
+    """
+    size = sample_size()
+    if not size:
+        return probe_random_pins(queryset, seed, page, per_page)
+
+    lo = (seed + (page - 1) * per_page) % size
+    hi = lo + per_page
+    window = Q(random_sample__position__gte=lo, random_sample__position__lt=min(hi, size))
+    if hi > size:
+        # The window wraps past the end of the sample
+        window |= Q(random_sample__position__lt=hi - size)
+
+    pins = list(queryset.filter(window).order_by('random_sample__position'))
+    return pins, page * per_page < size
+
+
+def probe_random_pins(queryset, seed, page=1, per_page=20):
+    """
+    Fallback sampler: jump to a primary key picked by the seed and read
+    forward along the pk index, wrapping to the start of the table if
+    needed. Every page of a seed starts from the same key, and page N picks
+    up where page N - 1 stopped, so pages never overlap. The feed ends after
+    the pk span or MAX_PROBED_PINS, whichever is smaller.
+    """
+    bounds = queryset.aggregate(lo=Min('pk'), hi=Max('pk'))
+    if bounds['lo'] is None:
+        return [], False
+
+    probe = random.Random(seed).randint(bounds['lo'], bounds['hi'])
+    offset = (page - 1) * per_page
+
+    after = queryset.filter(pk__gte=probe).order_by('pk')
+    pins = list(after[offset:offset + per_page])
+    if len(pins) < per_page:
+        # Past the end of the table: continue from its start up to the probe
+        wrapped = max(offset - after.count(), 0)
+        pins += list(queryset.filter(pk__lt=probe).order_by('pk')[wrapped:wrapped + per_page - len(pins)])
+    random.Random(f'{seed}:{page}').shuffle(pins)
+    served = page * per_page
+    return pins, len(pins) == per_page and served < min(bounds['hi'] - bounds['lo'] + 1, MAX_PROBED_PINS)
+
+
+def rebuild_sample(size=None):
+    """
+    Draw a fresh random sample of pin ids by probing the pk range and store
+    it shuffled. Returns the number of sampled pins.
+    """
+    if size is None:
+        size = getattr(settings, 'EXPLORE_RANDOM_SAMPLE_SIZE', 5000)
+
+    bounds = Pin.objects.aggregate(lo=Min('pk'), hi=Max('pk'))
+    if bounds['lo'] is None:
+        RandomPinSample.objects.all().delete()
+        return 0
+
+    span = bounds['hi'] - bounds['lo'] + 1
+    if span <= size * 2:
+        # Small table: sampling everything is cheaper than probing
+        pin_ids = list(Pin.objects.values_list('pk', flat=True))
+    else:
+        pin_ids = set()
+        for _ in range(10):
+            probes = random.sample(range(bounds['lo'], bounds['hi'] + 1), min(span, (size - len(pin_ids)) * 2))
+            pin_ids.update(Pin.objects.filter(pk__in=probes).values_list('pk', flat=True))
+            if len(pin_ids) >= size:
+                break
+        pin_ids = list(pin_ids)
+
+    random.shuffle(pin_ids)
+    pin_ids = pin_ids[:size]
+
+    with transaction.atomic():
+        RandomPinSample.objects.all().delete()
+        RandomPinSample.objects.bulk_create(
+            [RandomPinSample(position=position, pin_id=pin_id) for position, pin_id in enumerate(pin_ids)],
+            batch_size=1000
+        )
+    return len(pin_ids)
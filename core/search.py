@@ -0,0 +1,191 @@
+"""
+Pluggable full-text search for pins.
+
+``MySQLFullTextBackend`` ranks with ``MATCH ... AGAINST`` over a FULLTEXT
+index and is used in production. ``InMemoryBackend`` keeps a per-process
+inverted index scored with BM25, for SQLite and test setups where no
+full-text index exists. Pick one with ``settings.SEARCH_BACKEND``; when it is
+empty the backend is chosen from the database vendor.
+"""
+import math
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in',
+    'is', 'it', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'with',
+])
+
+
+def tokenize(text):
+    """Split text into lower-cased terms, dropping stop words"""
+    return [term for term in TOKEN_RE.findall((text or '').lower()) if term not in STOP_WORDS]
+
+
+class BaseSearchBackend:
+    """Interface every search backend implements"""
+
+    def search(self, query, queryset, offset=0, limit=20):
+        """
+        Return ``(pins, has_more)`` for the ranked matches of ``query`` that
+        are also in ``queryset`` (which carries premium filtering etc.).
+        """
+        raise NotImplementedError
+
+    def index_pin(self, pin):
+        """Add or refresh a pin in the index"""
+
+    def remove_pin(self, pin_id):
+        """Drop a pin from the index"""
+
+
+class MySQLFullTextBackend(BaseSearchBackend):
+    """Relevance-ranked search over the ``pins_pin_fulltext`` FULLTEXT index"""
+
+    # Must list exactly the columns of the FULLTEXT index for MySQL to use it
+    MATCH_SQL = 'MATCH (pins_pin.title, pins_pin.description, pins_pin.tags) AGAINST (%s IN NATURAL LANGUAGE MODE)'
+
+    def search(self, query, queryset, offset=0, limit=20):
+        rows = list(
+            queryset.annotate(relevance=RawSQL(self.MATCH_SQL, [query]))
+            .filter(relevance__gt=0)
+            .order_by('-relevance', '-id')[offset:offset + limit + 1]
+        )
+        return rows[:limit], len(rows) > limit
+
+
+class InMemoryBackend(BaseSearchBackend):
+    """
+    In-process inverted index with BM25 scoring.
+
+    The index is built lazily from the database on first use and kept up to
+    date through ``index_pin``/``remove_pin``. It lives in process memory, so
+    it is meant for development and tests rather than multi-worker deploys.
+    """
+
+    K1 = 1.5
+    B = 0.75
+    TITLE_BOOST = 2
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        self._postings = defaultdict(dict)  # term -> {pin_id: term frequency}
+        self._doc_terms = {}  # pin_id -> {term: term frequency}
+        self._doc_lengths = {}
+        self._total_length = 0
+
+    def _document_terms(self, title, description, tags):
+        terms = tokenize(title) * self.TITLE_BOOST + tokenize(description) + tokenize(tags.replace(',', ' '))
+        frequencies = defaultdict(int)
+        for term in terms:
+            frequencies[term] += 1
+        return frequencies, len(terms)
+
+    def _add(self, pin_id, title, description, tags):
+        self._remove(pin_id)
+        frequencies, length = self._document_terms(title, description, tags)
+        for term, frequency in frequencies.items():
+            self._postings[term][pin_id] = frequency
+        self._doc_terms[pin_id] = frequencies
+        self._doc_lengths[pin_id] = length
+        self._total_length += length
+
+    def _remove(self, pin_id):
+        frequencies = self._doc_terms.pop(pin_id, None)
+        if frequencies is None:
+            return
+        for term in frequencies:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(pin_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(pin_id, 0)
+
+    def _ensure_built(self):
+        if self._built:
+            return
+        from pins.models import Pin
+
+        with self._lock:
+            if self._built:
+                return
+            for pin_id, title, description, tags in Pin.objects.values_list(
+                'id', 'title', 'description', 'tags'
+            ).iterator(chunk_size=2000):
+                self._add(pin_id, title, description, tags)
+            self._built = True
+
+    def rank(self, query):
+        """Return pin ids matching ``query`` ordered by BM25 score"""
+        self._ensure_built()
+        terms = set(tokenize(query))
+        if not terms or not self._doc_lengths:
+            return []
+
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            avg_length = self._total_length / doc_count
+            scores = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for pin_id, frequency in postings.items():
+                    norm = 1 - self.B + self.B * self._doc_lengths[pin_id] / avg_length
+                    scores[pin_id] += idf * frequency * (self.K1 + 1) / (frequency + self.K1 * norm)
+
+        return sorted(scores, key=lambda pin_id: (-scores[pin_id], -pin_id))
+
+    def search(self, query, queryset, offset=0, limit=20):
+        ranked = self.rank(query)
+        wanted = offset + limit + 1
+        matches = []
+
+        # Walk the ranking in chunks, keeping only pins the queryset allows
+        chunk_size = max(wanted, 100)
+        for start in range(0, len(ranked), chunk_size):
+            chunk = ranked[start:start + chunk_size]
+            allowed = queryset.in_bulk(chunk)
+            matches.extend(allowed[pin_id] for pin_id in chunk if pin_id in allowed)
+            if len(matches) >= wanted:
+                break
+
+        page = matches[offset:offset + limit + 1]
+        return page[:limit], len(page) > limit
+
+    def index_pin(self, pin):
+        self._ensure_built()
+        with self._lock:
+            self._add(pin.pk, pin.title, pin.description, pin.tags)
+
+    def remove_pin(self, pin_id):
+        with self._lock:
+            self._remove(pin_id)
+
+
+_backend = None
+
+
+def get_search_backend():
+    """Return the configured search backend (created once per process)"""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'SEARCH_BACKEND', '')
+        if not path:
+            if connection.vendor == 'mysql':
+                path = 'core.search.MySQLFullTextBackend'
+            else:
+                path = 'core.search.InMemoryBackend'
+        _backend = import_string(path)()
+    return _backend
@@ -1,3 +1,14 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.test import TransactionTestCase
+
+from core.management.commands.explain_hot_queries import Command as ExplainHotQueries
+
+
+class HotQueryIndexTests(TransactionTestCase):
+    """The feed, inbox, chat and notification queries must stay on indexes"""
+
+    def test_hot_queries_use_indexes(self):
+        output = StringIO()
+        failures = ExplainHotQueries(stdout=output).run_checks(rows=5000)
+        self.assertEqual(failures, 0, output.getvalue())
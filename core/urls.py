@@ -7,4 +7,5 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('explore/', views.explore, name='explore'),
     path('search/', views.search, name='search'),
+    path('health/channels/', views.channel_layer_health, name='channel_layer_health'),
 ]
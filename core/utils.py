@@ -0,0 +1,57 @@
+"""
+Shared helpers for Somrosly apps
+"""
+from django.db import transaction
+from django.db.models import F, Max, Min
+from django.db.models.functions import Greatest
+
+
+def adjust_counter(model, pk, field, delta=1):
+    """
+    Atomically add ``delta`` to a denormalized counter column.
+
+    The update runs as a single ``UPDATE ... SET field = field + delta`` so
+    concurrent requests never lose increments, and it is clamped at zero so
+    a double delete can't push a counter negative.
+    """
+    if pk is None or not delta:
+        return
+    model.objects.filter(pk=pk).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def pk_ranges(model, batch_size):
+    """
+    Yield ``(start, end)`` primary-key ranges covering ``model``'s table, so
+    maintenance jobs can work through it ``batch_size`` keys per query.
+    """
+    bounds = model.objects.aggregate(lo=Min('pk'), hi=Max('pk'))
+    if bounds['lo'] is None:
+        return
+    for start in range(bounds['lo'], bounds['hi'] + 1, batch_size):
+        yield start, start + batch_size
+
+
+def toggle_like(instance, user):
+    """
+    Like or unlike ``instance`` (anything with a ``likes`` M2M and a
+    ``like_count`` column) on behalf of ``user``.
+
+    Works directly on the through table so the counter only moves when a row
+    was really inserted or deleted. Returns ``True`` if the user now likes it.
+    """
+    manager = instance.likes
+    lookup = {
+        f'{manager.source_field_name}_id': instance.pk,
+        f'{manager.target_field_name}_id': user.pk,
+    }
+    
+    with transaction.atomic():
+        deleted, _ = manager.through.objects.filter(**lookup).delete()
+        if deleted:
+            adjust_counter(type(instance), instance.pk, 'like_count', -deleted)
+            return False
+        
+        _, created = manager.through.objects.get_or_create(**lookup)
+        if created:
+            adjust_counter(type(instance), instance.pk, 'like_count', 1)
+        return True
@@ -1,61 +1,87 @@
 from django.shortcuts import render
-from django.db.models import Q, Count
 from django.http import JsonResponse
+from asgiref.sync import async_to_sync
 from django.template.loader import render_to_string
 from pins.models import Pin
 from boards.models import Board
+from .pagination import KeysetPaginator, InvalidCursor
+from .realtime import check_channel_layer
+from .feed_cache import get_cached_sections, set_cached_sections
+from .sampling import get_session_seed, random_page
+from .search import get_search_backend
+
+PER_PAGE = 20
+
+
+def recent_paginator(viewer):
+    """Keyset paginator for the chronological feed"""
+    queryset = Pin.objects.for_grid(viewer)
+    return KeysetPaginator(queryset, ['-created_at', '-id'], per_page=PER_PAGE, name='recent')
+
+
+def popular_paginator(viewer):
+    """Keyset paginator for the most-liked feed"""
+    # Sorts on the indexed like_count counter instead of COUNT()ing the M2M table
+    queryset = Pin.objects.for_grid(viewer).filter(like_count__gt=0)
+    return KeysetPaginator(queryset, ['-like_count', '-id'], per_page=PER_PAGE, name='popular')
 
 
 def home(request):
     """Homepage view - All pins feed like Pinterest (infinite scroll)"""
-    page = int(request.GET.get('page', 1))
-    per_page = 20
-    start = (page - 1) * per_page
-    end = start + per_page
-    
     # Show ALL pins (including user's own) - simple chronological feed
-    pins = Pin.objects.all().order_by('-created_at')[start:end]
+    try:
+        page = recent_paginator(request.user).get_page(request.GET.get('cursor'))
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
     # AJAX request for infinite scroll
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         html = render_to_string('core/_pin_grid.html', {
-            'pins': pins,
+            'pins': page.items,
             'request': request
         })
         return JsonResponse({
             'html': html,
-            'has_more': len(pins) == per_page
+            'has_more': page.has_more,
+            'next_cursor': page.next_cursor,
         })
     
     context = {
-        'pins': pins,
+        'pins': page.items,
+        'has_more': page.has_more,
+        'next_cursor': page.next_cursor,
     }
     return render(request, 'core/home.html', context)
 
 
 def explore(request):
     """Explore page - Discover trending and popular content with infinite scroll"""
-    page = int(request.GET.get('page', 1))
     section = request.GET.get('section', 'popular')
-    per_page = 20
-    
-    start = (page - 1) * per_page
-    end = start + per_page
-    
-    if section == 'popular':
-        # Get popular pins (most liked)
-        pins = Pin.objects.annotate(
-            total_likes=Count('likes')
-        ).filter(total_likes__gt=0).order_by('-total_likes')[start:end]
-    elif section == 'recent':
-        # Get recent pins
-        pins = Pin.objects.all().order_by('-created_at')[start:end]
-    else:  # random
-        # Get random pins
-        pins = Pin.objects.all().order_by('?')[start:end]
     
     # AJAX request for infinite scroll
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        if section in ('popular', 'recent'):
+            paginator = popular_paginator(request.user) if section == 'popular' else recent_paginator(request.user)
+            try:
+                page = paginator.get_page(request.GET.get('cursor'))
+            except InvalidCursor as e:
+                return JsonResponse({'error': str(e)}, status=400)
+            pins = page.items
+            has_more = page.has_more
+            next_cursor = page.next_cursor
+        else:  # random
+            try:
+                page_number = max(int(request.GET.get('page', 1)), 1)
+            except ValueError:
+                return JsonResponse({'error': 'Invalid page'}, status=400)
+            pins, has_more = random_page(
+                Pin.objects.for_grid(request.user),
+                get_session_seed(request),
+                page=page_number,
+                per_page=PER_PAGE
+            )
+            next_cursor = None
+        
         html = render_to_string('core/_pin_grid.html', {
             'pins': pins,
             'request': request,
@@ -63,39 +89,81 @@ def explore(request):
         })
         return JsonResponse({
             'html': html,
-            'has_more': len(pins) == per_page
+            'has_more': has_more,
+            'next_cursor': next_cursor,
         })
     
     # Initial page load
-    popular_pins = Pin.objects.annotate(
-        total_likes=Count('likes')
-    ).filter(total_likes__gt=0).order_by('-total_likes')[:20]
-    
-    recent_pins = Pin.objects.all().order_by('-created_at')[:20]
-    random_pins = Pin.objects.all().order_by('?')[:20]
+    return render(request, 'core/explore.html', explore_sections(request))
+
+
+def build_explore_sections(viewer, seed):
+    """Run the three first-page feed queries for the explore page"""
+    popular_page = popular_paginator(viewer).get_page()
+    recent_page = recent_paginator(viewer).get_page()
+    random_pins, _ = random_page(
+        Pin.objects.for_grid(viewer),
+        seed,
+        per_page=PER_PAGE
+    )
     
-    context = {
-        'popular_pins': popular_pins,
-        'recent_pins': recent_pins,
+    return {
+        'popular_pins': popular_page.items,
+        'recent_pins': recent_page.items,
         'random_pins': random_pins,
+        'next_cursors': {
+            'popular': popular_page.next_cursor,
+            'recent': recent_page.next_cursor,
+        },
+        'random_seed': seed,
     }
-    return render(request, 'core/explore.html', context)
+
+
+def explore_sections(request):
+    """
+    Explore's first pages. Everyone except premium users sees the same
+    public feed, so it is shared through the cache.
+    """
+    if request.user.is_authenticated and request.user.is_premium:
+        return build_explore_sections(request.user, get_session_seed(request))
+    
+    sections = get_cached_sections()
+    if sections is None:
+        sections = build_explore_sections(None, get_session_seed(request))
+        set_cached_sections(sections)
+    else:
+        # Continue the random feed from the page that was cached
+        get_session_seed(request, sections['random_seed'])
+    return sections
 
 
 def search(request):
-    """Search view"""
-    query = request.GET.get('q', '')
+    """Search view - ranked full-text search, paginated"""
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
     results = []
+    has_more = False
     
     if query:
-        results = Pin.objects.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(tags__icontains=query)
+        results, has_more = get_search_backend().search(
+            query, Pin.objects.for_grid(request.user), offset=(page - 1) * PER_PAGE, limit=PER_PAGE
         )
     
     context = {
         'query': query,
         'results': results,
+        'page': page,
+        'has_more': has_more,
+        'previous_page': page - 1 if page > 1 else None,
+        'next_page': page + 1 if has_more else None,
     }
     return render(request, 'core/search.html', context)
+
+
+def channel_layer_health(request):
+    """Health check - round trip a group message through the channel layer"""
+    result = async_to_sync(check_channel_layer)()
+    return JsonResponse(result, status=200 if result['ok'] else 503)
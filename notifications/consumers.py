@@ -1,7 +1,7 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from .models import Notification
+from .models import UnreadNotificationCounter
 
 
 class NotificationConsumer(AsyncWebsocketConsumer):
@@ -42,8 +42,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         
         if action == 'mark_read':
             notification_id = data.get('notification_id')
-            await self.mark_notification_read(notification_id)
-            count = await self.get_unread_count()
+            count = await self.mark_notification_read(notification_id)
             await self.send(text_data=json.dumps({
                 'type': 'unread_count',
                 'count': count
@@ -73,17 +72,14 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     
     @database_sync_to_async
     def get_unread_count(self):
-        return self.user.notifications.filter(is_read=False).count()
+        return UnreadNotificationCounter.get_count(self.user.id)
     
     @database_sync_to_async
     def mark_notification_read(self, notification_id):
-        try:
-            notification = self.user.notifications.get(id=notification_id)
-            notification.is_read = True
-            notification.save()
-        except Notification.DoesNotExist:
-            pass
+        """Mark one notification read and return the new unread count, in one thread hop"""
+        self.user.notifications.filter(id=notification_id).mark_read()
+        return UnreadNotificationCounter.get_count(self.user.id)
     
     @database_sync_to_async
     def mark_all_read(self):
-        self.user.notifications.filter(is_read=False).update(is_read=True)
+        self.user.notifications.mark_read()
@@ -0,0 +1,305 @@
+"""
+Notification dispatch.
+
+Views create notifications through ``notify``. The row is written in the
+request's transaction; the WebSocket push is queued once it commits and sent
+by a background worker thread, so request latency never includes the channel
+layer round trip. The worker drains the queue in batches: one query loads the
+batch's notifications, one cache round trip fetches the recipients' unread
+counts, and all of the batch's group sends go out concurrently on the
+worker's own event loop (which keeps the channel layer's connection pool warm
+between batches).
+
+Pushes are rate-limited per recipient: within NOTIFICATION_PUSH_INTERVAL only
+the first push goes out and later ones are held back, then the newest held
+notification is sent once the interval has passed. Each push carries the
+unread count, so skipped ones lose nothing the client shows. The limit is per
+process, which is where the dispatcher runs.
+
+``broadcast`` hands arbitrary ``(group, event)`` pairs (e.g. chat messages
+from a bulk pin share) to the same worker; those skip the rate limit and go
+out in the next batch's concurrent send.
+
+The worker only runs in front of a Redis channel layer, which is safe to use
+from its own event loop. The in-memory layer is built on asyncio queues owned
+by the server's loop, so with it (development, single process) pushes are
+sent inline from the committing request thread through ``async_to_sync``,
+which runs them on the server's loop. At interpreter exit the worker drains
+its queue and held pushes before the process goes away.
+"""
+import asyncio
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+# Queued to ask the worker to flush everything and exit
+_STOP = object()
+
+
+def notify(recipient, notification_type, message, sender=None, link=''):
+    """
+    Create a notification for ``recipient`` and push it over WebSocket after
+    the current transaction commits. Returns the Notification.
+    """
+    from .models import Notification
+
+    notification = Notification.objects.create(
+        recipient=recipient,
+        sender=sender,
+        notification_type=notification_type,
+        message=message,
+        link=link
+    )
+    transaction.on_commit(lambda: get_dispatcher().enqueue(notification.pk))
+    return notification
+
+
+def notify_grouped(recipient, notification_type, target, verb, sender, link=''):
+    """
+    Like ``notify``, but folds repeated activity on ``target`` (e.g. 'pin:42')
+    into one notification: "alice and 41 others liked your pin".
+    """
+    from .models import Notification
+
+    notification = Notification.coalesce(recipient, notification_type, target, verb, sender, link)
+    transaction.on_commit(lambda: get_dispatcher().enqueue(notification.pk))
+    return notification
+
+
+def broadcast(events):
+    """Send ``[(group, event), ...]`` through the channel layer after the current transaction commits"""
+    events = list(events)
+    if events:
+        transaction.on_commit(lambda: get_dispatcher().enqueue_events(events))
+
+
+def uses_background_worker():
+    """True when the channel layer can be driven from the worker's own event loop"""
+    layer = get_channel_layer()
+    return layer is not None and type(layer).__module__.startswith('channels_redis')
+
+
+def get_dispatcher():
+    """Lazily create the shared dispatcher (a worker thread for Redis, inline otherwise)"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            batch_size = getattr(settings, 'NOTIFICATION_DISPATCH_BATCH', 100)
+            if uses_background_worker():
+                _dispatcher = NotificationDispatcher(
+                    batch_size,
+                    getattr(settings, 'NOTIFICATION_PUSH_INTERVAL', 2.0)
+                )
+                _dispatcher.start()
+                atexit.register(_dispatcher.stop)
+            else:
+                _dispatcher = InlineDispatcher(batch_size)
+    return _dispatcher
+
+
+def serialize(notification):
+    return {
+        'id': notification.id,
+        'type': notification.notification_type,
+        'message': notification.message,
+        'link': notification.link,
+        'sender': notification.sender.username if notification.sender else None,
+        'actor_count': notification.actor_count,
+        'created_at': notification.created_at.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+class NotificationDispatcher:
+    """Daemon thread fanning queued notification ids out to the recipients' groups"""
+
+    def __init__(self, batch_size=100, push_interval=2.0):
+        self.batch_size = batch_size
+        self.push_interval = push_interval
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name='notification-dispatch', daemon=True)
+        self.loop = None
+        # Recipient id -> monotonic time of their last push
+        self.last_push = {}
+        # Recipient id -> newest notification id held back by the rate limit
+        self.held = {}
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        """Flush queued and held pushes, then end the worker"""
+        if self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join(timeout)
+
+    def enqueue(self, notification_id):
+        self.queue.put(notification_id)
+
+    def enqueue_events(self, events):
+        self.queue.put(events)
+
+    def next_batch(self):
+        """
+        Block for one id (or until a held push is due), then take whatever
+        else is already queued up to the batch size, plus the due held pushes
+        """
+        batch = []
+        try:
+            batch.append(self.queue.get(timeout=self.push_interval if self.held else None))
+        except queue.Empty:
+            pass
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+
+        for recipient_id in [r for r in self.held if self.may_push(r)]:
+            batch.append(self.held.pop(recipient_id))
+        return batch
+
+    def may_push(self, recipient_id, now=None):
+        now = time.monotonic() if now is None else now
+        return now - self.last_push.get(recipient_id, -self.push_interval) >= self.push_interval
+
+    def rate_limit(self, notifications):
+        """Keep each recipient's newest notification, and only for those not pushed to within the interval"""
+        latest = {}
+        for notification in sorted(notifications, key=lambda n: n.created_at):
+            latest[notification.recipient_id] = notification
+
+        now = time.monotonic()
+        due = []
+        for recipient_id, notification in latest.items():
+            if self.may_push(recipient_id, now):
+                self.held.pop(recipient_id, None)
+                self.last_push[recipient_id] = now
+                due.append(notification)
+            else:
+                self.held[recipient_id] = notification.pk
+
+        # Forget recipients whose interval is over so the map stays small
+        for recipient_id in [r for r, at in self.last_push.items() if now - at >= self.push_interval]:
+            if recipient_id not in self.held:
+                del self.last_push[recipient_id]
+        return due
+
+    def drain(self):
+        """Everything still queued or held, for the final flush"""
+        batch = list(self.held.values())
+        self.held.clear()
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                return batch
+            if item is not _STOP:
+                batch.append(item)
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        while True:
+            batch = self.next_batch()
+            stopping = _STOP in batch
+            if stopping:
+                batch = [item for item in batch if item is not _STOP] + self.drain()
+                # The process is exiting: send the held pushes now
+                self.push_interval = 0
+            if batch:
+                self.process(batch)
+            if stopping:
+                self.loop.close()
+                return
+
+    def process(self, batch):
+        # The worker keeps its own DB connection; don't let it go stale
+        close_old_connections()
+        try:
+            self.dispatch(
+                [item for item in batch if not isinstance(item, list)],
+                [event for item in batch if isinstance(item, list) for event in item]
+            )
+        except Exception:
+            logger.exception('Dispatching %d notifications failed', len(batch))
+        finally:
+            close_old_connections()
+
+    def dispatch(self, notification_ids, events=()):
+        from .models import Notification, UnreadNotificationCounter
+
+        events = list(events)
+        if notification_ids:
+            notifications = self.rate_limit(
+                Notification.objects.filter(pk__in=notification_ids).select_related('sender')
+            )
+            counts = UnreadNotificationCounter.get_counts({n.recipient_id for n in notifications})
+            events.extend(
+                (f'notifications_{n.recipient_id}', {
+                    'type': 'notification_message',
+                    'notification': serialize(n),
+                    'count': counts.get(n.recipient_id, 0)
+                })
+                for n in sorted(notifications, key=lambda n: n.pk)
+            )
+        if events:
+            self.send_events(events)
+
+    def send_events(self, events):
+        self.loop.run_until_complete(self.send(events))
+
+    async def send(self, events):
+        channel_layer = get_channel_layer()
+        results = await asyncio.gather(
+            *(channel_layer.group_send(group, event) for group, event in events),
+            return_exceptions=True
+        )
+        for (group, _), result in zip(events, results):
+            if isinstance(result, Exception):
+                logger.warning('Notification push to %s failed: %s', group, result)
+
+
+class InlineDispatcher(NotificationDispatcher):
+    """
+    Sends each push straight away from the committing thread, for channel
+    layers that only work on the server's own event loop (the in-memory layer)
+    """
+
+    def __init__(self, batch_size=100):
+        super().__init__(batch_size, push_interval=0)
+
+    def start(self):
+        pass
+
+    def stop(self, timeout=5.0):
+        pass
+
+    def enqueue(self, notification_id):
+        self.process([notification_id])
+
+    def enqueue_events(self, events):
+        self.process([events])
+
+    def process(self, batch):
+        try:
+            self.dispatch(
+                [item for item in batch if not isinstance(item, list)],
+                [event for item in batch if isinstance(item, list) for event in item]
+            )
+        except Exception:
+            logger.exception('Dispatching %d notifications failed', len(batch))
+
+    def send_events(self, events):
+        async_to_sync(self.send)(events)
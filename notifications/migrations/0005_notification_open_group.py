@@ -0,0 +1,43 @@
+# Generated by Django 5.1.13 on 2026-10-17 18:05
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def open_latest_groups(apps, schema_editor):
+    """Reopen the newest unread notification of each (recipient, group) for coalescing"""
+    Notification = apps.get_model('notifications', 'Notification')
+    latest_ids = (
+        Notification.objects.filter(is_read=False).exclude(group_key='')
+        .values('recipient_id', 'group_key')
+        .annotate(latest=Max('id'))
+        .values_list('latest', flat=True)
+    )
+    for notification in Notification.objects.filter(pk__in=list(latest_ids)).only('id', 'group_key'):
+        Notification.objects.filter(pk=notification.pk).update(open_group_key=notification.group_key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_notification_coalescing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='open_group_key',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.RunPython(open_latest_groups, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(
+                fields=('recipient', 'open_group_key'), name='notif_recipient_open_group_uniq'
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notif_recipient_group_idx',
+        ),
+    ]
@@ -1,5 +1,42 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
 from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+
+class NotificationQuerySet(models.QuerySet):
+    """Keeps UnreadNotificationCounter in step with bulk updates and deletes"""
+    
+    def _unread_per_recipient(self):
+        return list(
+            self.filter(is_read=False)
+            .order_by()
+            .values('recipient_id')
+            .annotate(n=Count('id'))
+            .values_list('recipient_id', 'n')
+        )
+    
+    def mark_read(self):
+        """Mark the notifications read and decrement their recipients' counters"""
+        with transaction.atomic():
+            per_recipient = self._unread_per_recipient()
+            # Read notifications stop collecting new actors
+            updated = self.filter(is_read=False).update(is_read=True, open_group_key=None)
+            for user_id, n in per_recipient:
+                UnreadNotificationCounter.adjust(user_id, -n)
+        return updated
+    
+    def delete(self):
+        with transaction.atomic():
+            per_recipient = self._unread_per_recipient()
+            result = super().delete()
+            for user_id, n in per_recipient:
+                UnreadNotificationCounter.adjust(user_id, -n)
+        return result
 
 
 class Notification(models.Model):
@@ -29,10 +66,182 @@ class Notification(models.Model):
     message = models.TextField()
     link = models.CharField(max_length=500, blank=True)
     is_read = models.BooleanField(default=False)
+    # Time of the latest activity; moved forward when another actor is coalesced in
     created_at = models.DateTimeField(auto_now_add=True)
+    # Coalescing: activity sharing a group key (e.g. 'like:pin:42') is folded
+    # into one row listing every actor, newest first
+    group_key = models.CharField(max_length=100, blank=True, default='')
+    # group_key while the row still collects actors (unread, recently
+    # active), NULL after; unique per recipient so there's one open row
+    open_group_key = models.CharField(max_length=100, null=True, blank=True, editable=False)
+    actor_count = models.PositiveIntegerField(default=1)
+    actor_ids = models.JSONField(default=list, blank=True)
+    
+    objects = NotificationQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', 'is_read', '-created_at'], name='notif_recipient_unread_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['recipient', 'open_group_key'], name='notif_recipient_open_group_uniq'),
+        ]
     
     def __str__(self):
         return f"{self.notification_type} for {self.recipient.username}"
+    
+    def save(self, *args, **kwargs):
+        """Count new unread notifications in the same transaction as the insert"""
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding and not self.is_read:
+                UnreadNotificationCounter.adjust(self.recipient_id, 1)
+    
+    @staticmethod
+    def summarize(username, actor_count, verb):
+        """'alice liked ...', 'alice and 1 other liked ...', 'alice and 41 others liked ...'"""
+        if actor_count <= 1:
+            return f'{username} {verb}'
+        others = actor_count - 1
+        return f'{username} and {others} other{"s" if others > 1 else ""} {verb}'
+    
+    @classmethod
+    def coalesce(cls, recipient, notification_type, target, verb, sender, link=''):
+        """
+        Record that ``sender`` did ``verb`` to ``target`` (e.g. 'pin:42'). Folds
+        into the recipient's open notification for the same type and target
+        when it saw activity within NOTIFICATION_COALESCE_WINDOW, otherwise
+        starts a new one. Returns the created or updated Notification.
+        """
+        group_key = f'{notification_type}:{target}'
+        now = timezone.now()
+        since = now - timedelta(seconds=settings.NOTIFICATION_COALESCE_WINDOW)
+        
+        with transaction.atomic():
+            notification = cls.open_group(recipient.id, group_key)
+            if notification is not None and notification.created_at < since:
+                # Activity went quiet: leave that one as it is and start afresh
+                cls.objects.filter(pk=notification.pk).update(open_group_key=None)
+                notification = None
+            
+            if notification is None:
+                try:
+                    with transaction.atomic():
+                        return cls.objects.create(
+                            recipient=recipient,
+                            sender=sender,
+                            notification_type=notification_type,
+                            message=cls.summarize(sender.username, 1, verb),
+                            link=link,
+                            group_key=group_key,
+                            open_group_key=group_key,
+                            actor_ids=[sender.id]
+                        )
+                except IntegrityError:
+                    # A concurrent first actor opened the group; fold into theirs
+                    notification = cls.open_group(recipient.id, group_key)
+            
+            # An actor acting again (like, unlike, like) isn't counted twice
+            notification.actor_ids = [sender.id] + [
+                actor_id for actor_id in notification.actor_ids if actor_id != sender.id
+            ]
+            notification.actor_count = len(notification.actor_ids)
+            notification.sender = sender
+            notification.message = cls.summarize(sender.username, notification.actor_count, verb)
+            notification.created_at = now
+            notification.save(update_fields=['sender', 'message', 'actor_count', 'actor_ids', 'created_at'])
+            return notification
+    
+    @classmethod
+    def retract(cls, recipient, notification_type, target, verb, sender):
+        """
+        Undo ``coalesce`` when ``sender`` takes the action back (an unlike):
+        drop them from the open notification, or delete it if they were its
+        only actor. Read notifications are left alone.
+        """
+        from users.models import User
+        
+        with transaction.atomic():
+            notification = cls.open_group(recipient.id, f'{notification_type}:{target}')
+            if notification is None or sender.id not in notification.actor_ids:
+                return
+            
+            actor_ids = [actor_id for actor_id in notification.actor_ids if actor_id != sender.id]
+            if not actor_ids:
+                # The queryset delete keeps the unread counter right
+                cls.objects.filter(pk=notification.pk).delete()
+                return
+            
+            latest = User.objects.only('id', 'username').get(pk=actor_ids[0])
+            notification.actor_ids = actor_ids
+            notification.actor_count = len(actor_ids)
+            notification.sender = latest
+            notification.message = cls.summarize(latest.username, notification.actor_count, verb)
+            notification.save(update_fields=['sender', 'message', 'actor_count', 'actor_ids'])
+    
+    @classmethod
+    def open_group(cls, recipient_id, group_key):
+        """The recipient's open notification for ``group_key``, locked, or None"""
+        return cls.objects.select_for_update().filter(recipient_id=recipient_id, open_group_key=group_key).first()
+
+
+class UnreadNotificationCounter(models.Model):
+    """Maintained number of unread notifications per user"""
+    
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='unread_notification_counter'
+    )
+    count = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.count} unread for user {self.user_id}"
+    
+    @staticmethod
+    def cache_key(user_id):
+        return f'unread:notifications:{user_id}'
+    
+    @classmethod
+    def adjust(cls, user_id, delta):
+        """Atomically add ``delta`` to a user's counter, creating it if needed"""
+        if not delta:
+            return
+        updated = cls.objects.filter(user_id=user_id).update(count=Greatest(F('count') + delta, 0))
+        if not updated and delta > 0:
+            cls.objects.get_or_create(user_id=user_id)
+            cls.objects.filter(user_id=user_id).update(count=F('count') + delta)
+        transaction.on_commit(lambda: cache.delete(cls.cache_key(user_id)))
+    
+    @classmethod
+    def get_count(cls, user_id):
+        """Unread notification count, served from the cache when possible"""
+        key = cls.cache_key(user_id)
+        count = cache.get(key)
+        if count is None:
+            count = cls.objects.filter(user_id=user_id).values_list('count', flat=True).first() or 0
+            cache.set(key, count, settings.UNREAD_CACHE_TTL)
+        return count
+    
+    @classmethod
+    def get_counts(cls, user_ids):
+        """``get_count`` for many users: one cache round trip and at most one query"""
+        keys = {cls.cache_key(user_id): user_id for user_id in user_ids}
+        counts = {keys[key]: count for key, count in cache.get_many(keys).items()}
+        missing = [user_id for user_id in keys.values() if user_id not in counts]
+        if missing:
+            stored = dict(cls.objects.filter(user_id__in=missing).values_list('user_id', 'count'))
+            fetched = {user_id: stored.get(user_id, 0) for user_id in missing}
+            cache.set_many({cls.cache_key(user_id): count for user_id, count in fetched.items()},
+                           settings.UNREAD_CACHE_TTL)
+            counts.update(fetched)
+        return counts
+    
+    @classmethod
+    def reset(cls, user_id, count):
+        """Overwrite a user's counter with a recounted value"""
+        cls.objects.update_or_create(user_id=user_id, defaults={'count': count})
+        transaction.on_commit(lambda: cache.delete(cls.cache_key(user_id)))
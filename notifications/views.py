@@ -1,7 +1,7 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from .models import Notification
+from .models import UnreadNotificationCounter
 
 
 @login_required
@@ -16,7 +16,7 @@ def notifications_list(request):
 @login_required
 def get_unread_count(request):
     """Get count of unread notifications"""
-    count = request.user.notifications.filter(is_read=False).count()
+    count = UnreadNotificationCounter.get_count(request.user.id)
     return JsonResponse({'count': count})
 
 
@@ -35,24 +35,22 @@ def get_recent_notifications(request):
     
     return JsonResponse({
         'notifications': data,
-        'count': request.user.notifications.filter(is_read=False).count()
+        'count': UnreadNotificationCounter.get_count(request.user.id)
     })
 
 
 @login_required
 def mark_as_read(request, notification_id):
     """Mark notification as read"""
-    try:
-        notification = request.user.notifications.get(id=notification_id)
-        notification.is_read = True
-        notification.save()
-        return JsonResponse({'success': True})
-    except Notification.DoesNotExist:
+    notifications = request.user.notifications.filter(id=notification_id)
+    if not notifications.exists():
         return JsonResponse({'success': False}, status=404)
+    notifications.mark_read()
+    return JsonResponse({'success': True})
 
 
 @login_required
 def mark_all_as_read(request):
     """Mark all notifications as read"""
-    request.user.notifications.filter(is_read=False).update(is_read=True)
+    request.user.notifications.mark_read()
     return JsonResponse({'success': True})
@@ -0,0 +1,128 @@
+"""
+Background image pipeline for pin uploads.
+
+An upload is decoded once and downscaled into a set of renditions (grid
+thumbnail, detail, full) encoded as WebP and JPEG. Files are written through
+the storage API, so this works the same on the local filesystem and on
+S3/MinIO. The work runs in a small thread pool after the pin's transaction
+commits, keeping resizing and encoding off the request path.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Rendition name -> max width in pixels, largest first so each step
+# downscales the previous result instead of the original
+RENDITIONS = (
+    ('full', 1200),
+    ('detail', 736),
+    ('thumb', 236),
+)
+
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+)
+
+_executor = None
+
+
+def get_executor():
+    """Lazily create the shared worker pool"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'PIN_IMAGE_WORKERS', 2),
+            thread_name_prefix='pin-images'
+        )
+    return _executor
+
+
+def schedule_renditions(pin_id):
+    """Generate renditions for ``pin_id`` in the background once the save commits"""
+    transaction.on_commit(lambda: get_executor().submit(_run_in_worker, generate_renditions, pin_id))
+
+
+def schedule_rendition_cleanup(renditions):
+    """Delete a deleted pin's rendition files in the background"""
+    if renditions:
+        get_executor().submit(_run_in_worker, delete_renditions, renditions)
+
+
+def _run_in_worker(func, *args):
+    # Worker threads get their own DB connections; don't leak them
+    close_old_connections()
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Pin image job %s%r failed', func.__name__, args)
+    finally:
+        close_old_connections()
+
+
+def encode(image, fmt, options):
+    buffer = BytesIO()
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def build_renditions(source, base_path):
+    """
+    Decode ``source`` once and store every rendition under ``base_path``.
+
+    Returns the ``Pin.renditions`` mapping, e.g.
+    ``{'thumb': {'webp': 'pins/renditions/7/thumb.webp', 'jpeg': ..., 'width': 236, 'height': 354}, ...}``.
+    """
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.load()
+
+    renditions = {}
+    for name, max_width in RENDITIONS:
+        if image.width > max_width:
+            height = max(1, round(image.height * max_width / image.width))
+            image = image.resize((max_width, height), Image.Resampling.LANCZOS)
+
+        entry = {'width': image.width, 'height': image.height}
+        for extension, fmt, options in FORMATS:
+            path = f'{base_path}/{name}.{extension}'
+            entry[extension] = default_storage.save(path, ContentFile(encode(image, fmt, options)))
+        renditions[name] = entry
+    return renditions
+
+
+def generate_renditions(pin_id):
+    """Worker entry point: build and record renditions for one pin"""
+    from .models import Pin
+
+    pin = Pin.objects.filter(pk=pin_id).only('id', 'image', 'renditions').first()
+    if pin is None or not pin.image:
+        return
+
+    base_path = f'pins/renditions/{pin.pk}/{os.path.splitext(os.path.basename(pin.image.name))[0]}'
+    with pin.image.open('rb') as source:
+        renditions = build_renditions(source, base_path)
+
+    old = pin.renditions
+    Pin.objects.filter(pk=pin.pk).update(renditions=renditions)
+    if old:
+        delete_renditions(old)
+
+
+def delete_renditions(renditions):
+    for entry in renditions.values():
+        for extension, _, _ in FORMATS:
+            path = entry.get(extension)
+            if path:
+                default_storage.delete(path)
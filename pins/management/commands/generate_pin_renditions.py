@@ -0,0 +1,31 @@
+"""
+Management command to build image renditions for pins that don't have them yet
+"""
+from django.core.management.base import BaseCommand
+from pins.images import generate_renditions
+from pins.models import Pin
+
+
+class Command(BaseCommand):
+    help = 'Generate grid/detail/full image renditions for existing pins'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate renditions for every pin')
+
+    def handle(self, *args, **options):
+        pins = Pin.objects.exclude(image='')
+        if not options['all']:
+            pins = pins.filter(renditions={})
+
+        done = failed = 0
+        for pin_id in pins.values_list('pk', flat=True).iterator(chunk_size=500):
+            try:
+                generate_renditions(pin_id)
+                done += 1
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'✗ Pin {pin_id}: {e}'))
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Generated renditions for {done} pins'))
+        if failed:
+            self.stdout.write(self.style.ERROR(f'✗ Failed: {failed} pins'))
@@ -0,0 +1,60 @@
+"""
+Management command to repair drift in the denormalized counter columns
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from boards.models import Board
+from core.utils import pk_ranges
+from pins.models import Pin, Comment
+
+
+class Command(BaseCommand):
+    help = 'Recount likes, comments, replies and board pins and fix any drifted counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Primary-key range processed per query')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        # (model, counter field, rows being counted, column pointing at the model)
+        specs = [
+            (Pin, 'like_count', Pin.likes.through.objects.all(), 'pin_id'),
+            (Pin, 'comment_count', Comment.objects.all(), 'pin_id'),
+            (Comment, 'like_count', Comment.likes.through.objects.all(), 'comment_id'),
+            (Comment, 'reply_count', Comment.objects.all(), 'parent_id'),
+            (Board, 'pin_count', Pin.objects.all(), 'board_id'),
+        ]
+
+        for model, field, source, key in specs:
+            label = f'{model.__name__}.{field}'
+            checked, fixed = self.reconcile(model, field, source, key, batch_size, dry_run)
+            style = self.style.WARNING if fixed else self.style.SUCCESS
+            verb = 'would fix' if dry_run else 'fixed'
+            self.stdout.write(style(f'{label}: checked {checked}, {verb} {fixed}'))
+
+    def reconcile(self, model, field, source, key, batch_size, dry_run):
+        """Walk the table in primary-key ranges, comparing stored and real counts"""
+        checked = fixed = 0
+        for start, end in pk_ranges(model, batch_size):
+            stored = model.objects.filter(pk__gte=start, pk__lt=end).values_list('pk', field)
+            actual = dict(
+                source.filter(**{f'{key}__gte': start, f'{key}__lt': end})
+                .values(key)
+                .annotate(n=Count('*'))
+                .values_list(key, 'n')
+            )
+
+            drifted = []
+            for pk, value in stored:
+                checked += 1
+                if value != actual.get(pk, 0):
+                    drifted.append(model(pk=pk, **{field: actual.get(pk, 0)}))
+
+            fixed += len(drifted)
+            if drifted and not dry_run:
+                model.objects.bulk_update(drifted, [field])
+
+        return checked, fixed
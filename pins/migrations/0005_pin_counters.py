@@ -0,0 +1,52 @@
+# Generated by Django 5.1.13 on 2026-10-17 09:12
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    """Fill the new counter columns from the existing rows"""
+    Pin = apps.get_model('pins', 'Pin')
+    Comment = apps.get_model('pins', 'Comment')
+
+    specs = [
+        (Pin, 'like_count', Pin.likes.through.objects.all(), 'pin_id'),
+        (Pin, 'comment_count', Comment.objects.all(), 'pin_id'),
+        (Comment, 'like_count', Comment.likes.through.objects.all(), 'comment_id'),
+        (Comment, 'reply_count', Comment.objects.filter(parent__isnull=False), 'parent_id'),
+    ]
+    for model, field, source, key in specs:
+        counts = source.values(key).annotate(n=Count('*')).values_list(key, 'n')
+        objs = [model(pk=pk, **{field: n}) for pk, n in counts]
+        model.objects.bulk_update(objs, [field], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pins', '0004_pin_is_premium_only'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pin',
+            name='like_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pin',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
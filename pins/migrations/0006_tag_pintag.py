@@ -0,0 +1,74 @@
+# Generated by Django 5.1.13 on 2026-10-17 10:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def split_tags(raw):
+    names = []
+    for tag in (raw or '').split(','):
+        name = tag.strip().lower()[:50]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def populate_tags(apps, schema_editor):
+    """Build Tag/PinTag rows from the comma-separated Pin.tags field"""
+    Pin = apps.get_model('pins', 'Pin')
+    Tag = apps.get_model('pins', 'Tag')
+    PinTag = apps.get_model('pins', 'PinTag')
+
+    pin_names = {}
+    for pin_id, raw in Pin.objects.exclude(tags='').values_list('id', 'tags').iterator(chunk_size=2000):
+        names = split_tags(raw)
+        if names:
+            pin_names[pin_id] = names
+
+    all_names = {name for names in pin_names.values() for name in names}
+    Tag.objects.bulk_create([Tag(name=name) for name in all_names], batch_size=1000, ignore_conflicts=True)
+    tag_ids = dict(Tag.objects.values_list('name', 'id'))
+
+    PinTag.objects.bulk_create(
+        [PinTag(pin_id=pin_id, tag_id=tag_ids[name]) for pin_id, names in pin_names.items() for name in names],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pins', '0005_pin_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PinTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pin_tags', to='pins.pin')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pin_tags', to='pins.tag')),
+            ],
+            options={
+                'unique_together': {('tag', 'pin')},
+            },
+        ),
+        migrations.AddField(
+            model_name='pin',
+            name='tag_objects',
+            field=models.ManyToManyField(blank=True, related_name='pins', through='pins.PinTag', to='pins.tag'),
+        ),
+        migrations.RunPython(populate_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.13 on 2026-10-17 10:41
+
+from django.db import migrations
+
+
+def add_fulltext_index(apps, schema_editor):
+    """FULLTEXT indexes are MySQL-specific; other databases use the in-process index"""
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        'ALTER TABLE pins_pin ADD FULLTEXT INDEX pins_pin_fulltext (title, description, tags)'
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute('ALTER TABLE pins_pin DROP INDEX pins_pin_fulltext')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pins', '0006_tag_pintag'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+    ]
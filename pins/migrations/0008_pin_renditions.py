@@ -0,0 +1,18 @@
+# Generated by Django 5.1.13 on 2026-10-17 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pins', '0007_pin_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pin',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.13 on 2026-10-17 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0003_board_pin_count'),
+        ('pins', '0008_pin_renditions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['-created_at'], name='pin_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['is_premium_only', '-created_at'], name='pin_premium_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['board', '-created_at'], name='pin_board_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['pin', 'parent', 'created_at'], name='comment_pin_parent_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.13 on 2026-10-17 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pins', '0009_pin_comment_indexes'),
+    ]
+
+    operations = [
+        # New indexes first, so the board foreign key always has one on MySQL
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['-created_at', '-id'], name='pin_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['is_premium_only', '-created_at', '-id'], name='pin_premium_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['board', '-created_at', '-id'], name='pin_board_created_id_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='pin',
+            name='pin_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='pin',
+            name='pin_premium_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='pin',
+            name='pin_board_created_idx',
+        ),
+    ]
@@ -1,12 +1,52 @@
 from django.db import models
+from django.db.models import Case, Count, Exists, F, OuterRef, Q, Value, When
 from django.conf import settings
 from django.urls import reverse
-from PIL import Image
+from core.models import CounterFieldsMixin
 
 
-class Pin(models.Model):
+class PinFeedQuerySet(models.QuerySet):
+    """Queryset helpers shared by every view that renders a pin grid"""
+    
+    # Columns _pin_grid.html and the feed paginators actually read
+    GRID_FIELDS = (
+        'id', 'title', 'image', 'renditions', 'is_premium_only', 'like_count', 'created_at',
+        'user__username', 'user__profile_picture',
+    )
+    
+    def visible_to(self, viewer):
+        """Hide premium-only pins from anonymous and non-premium viewers"""
+        if viewer is None or not viewer.is_authenticated or not viewer.is_premium:
+            return self.filter(is_premium_only=False)
+        return self
+    
+    def with_like_state(self, viewer):
+        """Annotate ``is_liked`` for the viewer without loading the likes M2M"""
+        if viewer is None or not viewer.is_authenticated:
+            return self.annotate(is_liked=Value(False))
+        liked = Pin.likes.through.objects.filter(pin_id=OuterRef('pk'), user_id=viewer.pk)
+        return self.annotate(is_liked=Exists(liked))
+    
+    def for_grid(self, viewer):
+        """
+        Everything a grid card needs in a single query: the author joined in,
+        only the rendered columns, premium filtering and the viewer's like state.
+        """
+        return (
+            self.visible_to(viewer)
+            .select_related('user')
+            .only(*self.GRID_FIELDS)
+            .with_like_state(viewer)
+        )
+
+
+class Pin(CounterFieldsMixin, models.Model):
     """Model representing a pin (image/idea)"""
     
+    counter_fields = ('like_count', 'comment_count')
+    # Written by the rendition worker with a targeted update
+    background_fields = ('renditions',)
+    
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -22,19 +62,44 @@ class Pin(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='pins/')
+    # Storage paths of the resized copies built by pins.images (empty until processed)
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
     source_url = models.URLField(max_length=500, blank=True)
     tags = models.CharField(max_length=200, blank=True, help_text='Comma-separated tags')
+    # Normalized copy of ``tags`` kept in sync on save, used for indexed lookups
+    tag_objects = models.ManyToManyField(
+        'Tag',
+        through='PinTag',
+        related_name='pins',
+        blank=True
+    )
     is_premium_only = models.BooleanField(default=False, help_text='Only premium users can view this pin')
     likes = models.ManyToManyField(
         settings.AUTH_USER_MODEL,
         related_name='liked_pins',
         blank=True
     )
+    # Denormalized counters, maintained with F() updates (see core.utils.adjust_counter)
+    like_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = PinFeedQuerySet.as_manager()
+    
+    # Relevance weights for get_related_pins(); recency breaks ties
+    SHARED_TAG_WEIGHT = 3
+    SAME_BOARD_WEIGHT = 2
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset feeds order by (-created_at, -id); the id tiebreak has to
+            # be in the index too or every page needs an extra sort
+            models.Index(fields=['-created_at', '-id'], name='pin_created_id_idx'),
+            models.Index(fields=['is_premium_only', '-created_at', '-id'], name='pin_premium_created_id_idx'),
+            models.Index(fields=['board', '-created_at', '-id'], name='pin_board_created_id_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -42,26 +107,66 @@ class Pin(models.Model):
     def get_absolute_url(self):
         return reverse('pins:detail', kwargs={'pk': self.pk})
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored image so save() can tell when a new one was assigned
+        if 'image' in field_names:
+            instance._loaded_image_name = instance.image.name
+        return instance
+    
     def save(self, *args, **kwargs):
-        """Override save to optimize images"""
+        """Override save to queue image renditions and keep the tag and search indexes in sync"""
+        update_fields = kwargs.get('update_fields')
+        image_changed = (
+            self._state.adding
+            or (
+                (update_fields is None or 'image' in update_fields)
+                and self.image.name != getattr(self, '_loaded_image_name', self.image.name)
+            )
+        )
+        
         super().save(*args, **kwargs)
+        self._loaded_image_name = self.image.name
+        
+        if update_fields is None or 'tags' in update_fields:
+            self.sync_tags()
+        if update_fields is None or {'title', 'description', 'tags'} & set(update_fields):
+            from core.search import get_search_backend
+            get_search_backend().index_pin(self)
+        
+        if image_changed and self.image:
+            # Resizing happens in a worker pool once the transaction commits
+            from .images import schedule_renditions
+            schedule_renditions(self.pk)
+    
+    def rendition_url(self, name, extension):
+        """URL of a stored rendition, or None if it hasn't been generated yet"""
+        from django.core.files.storage import default_storage
         
-        if self.image:
-            try:
-                img = Image.open(self.image.path)
-                
-                # Resize if too large
-                max_size = (1200, 1200)
-                if img.height > max_size[1] or img.width > max_size[0]:
-                    img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                    img.save(self.image.path, optimize=True, quality=85)
-            except Exception:
-                pass
+        path = self.renditions.get(name, {}).get(extension)
+        return default_storage.url(path) if path else None
+    
+    def _srcset(self, extension):
+        entries = []
+        for name in ('thumb', 'detail', 'full'):
+            entry = self.renditions.get(name)
+            if entry and entry.get(extension):
+                entries.append(f"{self.rendition_url(name, extension)} {entry['width']}w")
+        return ', '.join(entries)
+    
+    @property
+    def webp_srcset(self):
+        return self._srcset('webp')
     
     @property
-    def like_count(self):
-        """Return the number of likes"""
-        return self.likes.count()
+    def jpeg_srcset(self):
+        return self._srcset('jpeg')
+    
+    @property
+    def thumb_url(self):
+        """Small JPEG for grid cards, falling back to the original upload"""
+        return self.rendition_url('thumb', 'jpeg') or self.image.url
     
     def get_tags_list(self):
         """Return tags as a list"""
@@ -69,15 +174,59 @@ class Pin(models.Model):
             return [tag.strip() for tag in self.tags.split(',')]
         return []
     
-    @property
-    def comment_count(self):
-        """Return the number of comments"""
-        return self.comments.count()
+    def sync_tags(self):
+        """Mirror the comma-separated ``tags`` field into the Tag/PinTag tables"""
+        names = Tag.normalize_list(self.tags)
+        
+        if names:
+            Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+        tag_ids = list(Tag.objects.filter(name__in=names).values_list('id', flat=True))
+        
+        PinTag.objects.filter(pin=self).exclude(tag_id__in=tag_ids).delete()
+        PinTag.objects.bulk_create(
+            [PinTag(pin=self, tag_id=tag_id) for tag_id in tag_ids],
+            ignore_conflicts=True
+        )
+    
+    def get_related_pins(self, queryset=None, limit=12):
+        """
+        Rank other pins by shared tags, same board and recency.
+        
+        Candidates are found through the (tag, pin) index and the board
+        foreign key, scored and sorted in one bounded query, so the cost
+        doesn't depend on the size of the pin table.
+        """
+        if queryset is None:
+            queryset = Pin.objects.all()
+        queryset = queryset.exclude(pk=self.pk)
+        
+        tag_ids = list(self.pin_tags.values_list('tag_id', flat=True))
+        if not tag_ids and not self.board_id:
+            return queryset.order_by('-created_at')[:limit]
+        
+        candidates = Q()
+        shared_tags = Value(0)
+        same_board = Value(0)
+        if tag_ids:
+            candidates |= Q(pin_tags__tag_id__in=tag_ids)
+            shared_tags = Count('pin_tags', filter=Q(pin_tags__tag_id__in=tag_ids))
+        if self.board_id:
+            candidates |= Q(board_id=self.board_id)
+            same_board = Case(When(board_id=self.board_id, then=Value(self.SAME_BOARD_WEIGHT)), default=Value(0))
+        
+        return (
+            queryset.filter(candidates)
+            .annotate(shared_tags=shared_tags)
+            .annotate(relevance=F('shared_tags') * self.SHARED_TAG_WEIGHT + same_board)
+            .order_by('-relevance', '-created_at', '-id')[:limit]
+        )
 
 
-class Comment(models.Model):
+class Comment(CounterFieldsMixin, models.Model):
     """Model representing a comment on a pin"""
     
+    counter_fields = ('like_count', 'reply_count')
+    
     pin = models.ForeignKey(
         Pin,
         on_delete=models.CASCADE,
@@ -102,21 +251,60 @@ class Comment(models.Model):
         related_name='liked_comments',
         blank=True
     )
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['pin', 'parent', 'created_at'], name='comment_pin_parent_idx'),
+        ]
     
     def __str__(self):
         return f"Comment by {self.user.username} on {self.pin.title}"
+
+
+class Tag(models.Model):
+    """Model representing a normalized pin tag"""
     
-    @property
-    def like_count(self):
-        """Return the number of likes"""
-        return self.likes.count()
+    name = models.CharField(max_length=50, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
     
-    @property
-    def reply_count(self):
-        """Return the number of replies"""
-        return self.replies.count()
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+    
+    @classmethod
+    def normalize_list(cls, raw):
+        """Turn a comma-separated string into unique, lower-cased tag names"""
+        names = []
+        for tag in (raw or '').split(','):
+            name = tag.strip().lower()[:cls._meta.get_field('name').max_length]
+            if name and name not in names:
+                names.append(name)
+        return names
+
+
+class PinTag(models.Model):
+    """Through table linking pins and tags (the inverted tag index)"""
+    
+    pin = models.ForeignKey(
+        Pin,
+        on_delete=models.CASCADE,
+        related_name='pin_tags'
+    )
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='pin_tags'
+    )
+    
+    class Meta:
+        unique_together = ('tag', 'pin')
+    
+    def __str__(self):
+        return f"{self.tag.name} on {self.pin.title}"
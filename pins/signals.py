@@ -0,0 +1,17 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.feed_cache import invalidate_explore_cache
+from .models import Pin
+
+
+@receiver(post_save, sender=Pin)
+@receiver(post_delete, sender=Pin)
+def drop_explore_cache(sender, **kwargs):
+    """
+    Any pin created, edited or deleted - including through a board or user
+    cascade - can change the cached explore sections. Dropped after commit
+    so a concurrent request can't cache the old rows again.
+    """
+    transaction.on_commit(invalidate_explore_cache)
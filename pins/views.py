@@ -2,17 +2,20 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
+from django.db import transaction
+from boards.models import Board
+from core.feed_cache import invalidate_explore_cache
+from core.search import get_search_backend
+from core.utils import adjust_counter, toggle_like
 from .models import Pin, Comment
 from .forms import PinCreateForm, PinUpdateForm
+from .images import schedule_rendition_cleanup
 
 
 def pin_list(request):
     """List all pins"""
-    pins = Pin.objects.all()
-    
-    # Filter premium-only pins for non-premium users
-    if not request.user.is_authenticated or not request.user.is_premium:
-        pins = pins.filter(is_premium_only=False)
+    # Filters premium-only pins for non-premium users
+    pins = Pin.objects.for_grid(request.user)
     
     return render(request, 'pins/list.html', {'pins': pins})
 
@@ -25,7 +28,9 @@ def pin_create(request):
         if form.is_valid():
             pin = form.save(commit=False)
             pin.user = request.user
-            pin.save()
+            with transaction.atomic():
+                pin.save()
+                Board.move_pin(None, pin.board_id)
             messages.success(request, 'Pin created successfully!')
             return redirect('pins:detail', pk=pin.pk)
     else:
@@ -47,31 +52,14 @@ def pin_detail(request, pk):
     # Get comments (only top-level comments, replies are fetched separately)
     comments = pin.comments.filter(parent__isnull=True).select_related('user').prefetch_related('replies', 'likes')
     
-    # Get related pins based on tags or same board
-    related_pins = Pin.objects.exclude(pk=pk)
-    
-    # Filter premium-only pins for non-premium users
-    if not request.user.is_authenticated or not request.user.is_premium:
-        related_pins = related_pins.filter(is_premium_only=False)
-    
-    # Try to find pins with similar tags
-    if pin.tags:
-        pin_tags = pin.get_tags_list()
-        related_by_tags = []
-        for p in related_pins:
-            p_tags = p.get_tags_list()
-            if any(tag in p_tags for tag in pin_tags):
-                related_by_tags.append(p)
-        if related_by_tags:
-            related_pins = related_by_tags[:12]
-        else:
-            related_pins = related_pins[:12]
-    elif pin.board:
-        # Get pins from same board
-        related_pins = pin.board.pins.exclude(pk=pk)[:12]
-    else:
-        # Get random recent pins
-        related_pins = related_pins[:12]
+    # Get related pins based on shared tags, same board and recency
+    # (premium-only pins are filtered out for non-premium users)
+    related_candidates = Pin.objects.for_grid(request.user)
+    
+    related_pins = list(pin.get_related_pins(related_candidates, limit=12))
+    if not related_pins:
+        # Nothing in common - fall back to recent pins
+        related_pins = related_candidates.exclude(pk=pk)[:12]
     
     return render(request, 'pins/detail.html', {
         'pin': pin,
@@ -91,9 +79,12 @@ def pin_edit(request, pk):
         return redirect('pins:detail', pk=pk)
     
     if request.method == 'POST':
+        old_board_id = pin.board_id
         form = PinUpdateForm(request.POST, instance=pin, user=request.user)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
+                Board.move_pin(old_board_id, pin.board_id)
             messages.success(request, 'Pin updated successfully!')
             return redirect('pins:detail', pk=pk)
     else:
@@ -113,7 +104,12 @@ def pin_delete(request, pk):
         return redirect('pins:detail', pk=pk)
     
     if request.method == 'POST':
-        pin.delete()
+        with transaction.atomic():
+            Board.move_pin(pin.board_id, None)
+            pin_id = pin.pk
+            pin.delete()
+        get_search_backend().remove_pin(pin_id)
+        schedule_rendition_cleanup(pin.renditions)
         messages.success(request, 'Pin deleted successfully!')
         return redirect('core:home')
     
@@ -124,36 +120,32 @@ def pin_delete(request, pk):
 def pin_like(request, pk):
     """Like/unlike a pin"""
     from notifications.models import Notification
-    from notifications.utils import send_notification_to_user
+    from notifications.dispatch import notify_grouped
     
     pin = get_object_or_404(Pin, pk=pk)
     
-    if request.user in pin.likes.all():
-        pin.likes.remove(request.user)
-        liked = False
-        # Delete notification if exists
-        Notification.objects.filter(
-            recipient=pin.user,
-            sender=request.user,
-            notification_type='like',
-            link=f'/pins/{pin.pk}/'
-        ).delete()
+    liked = toggle_like(pin, request.user)
+    # like_count moves by queryset update, which the Pin signals don't see
+    invalidate_explore_cache()
+    
+    if not liked:
+        # Take the user back out of the grouped like notification
+        if request.user != pin.user:
+            Notification.retract(pin.user, 'like', f'pin:{pin.pk}', f'liked your pin "{pin.title}"', request.user)
     else:
-        pin.likes.add(request.user)
-        liked = True
-        # Create notification for pin owner (if not liking own pin)
+        # Notify the pin owner (if not liking own pin), grouped per pin
         if request.user != pin.user:
-            notification = Notification.objects.create(
-                recipient=pin.user,
-                sender=request.user,
-                notification_type='like',
-                message=f'{request.user.username} liked your pin "{pin.title}"',
+            notify_grouped(
+                pin.user,
+                'like',
+                f'pin:{pin.pk}',
+                f'liked your pin "{pin.title}"',
+                request.user,
                 link=f'/pins/{pin.pk}/'
             )
-            # Send real-time notification via WebSocket
-            send_notification_to_user(pin.user, notification)
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        pin.refresh_from_db(fields=['like_count'])
         return JsonResponse({
             'liked': liked,
             'like_count': pin.like_count
@@ -165,9 +157,7 @@ def pin_like(request, pk):
 @login_required
 def save_to_board(request, pin_pk, board_pk):
     """Save a pin to a board"""
-    from boards.models import Board
-    from notifications.models import Notification
-    from notifications.utils import send_notification_to_user
+    from notifications.dispatch import notify_grouped
     
     pin = get_object_or_404(Pin, pk=pin_pk)
     board = get_object_or_404(Board, pk=board_pk, user=request.user)
@@ -180,20 +170,22 @@ def save_to_board(request, pin_pk, board_pk):
         })
     
     # Update pin's board
+    old_board_id = pin.board_id
     pin.board = board
-    pin.save()
+    with transaction.atomic():
+        pin.save(update_fields=['board', 'updated_at'])
+        Board.move_pin(old_board_id, board.pk)
     
     # Create notification for pin owner (if not saving own pin)
     if request.user != pin.user:
-        notification = Notification.objects.create(
-            recipient=pin.user,
-            sender=request.user,
-            notification_type='save',
-            message=f'{request.user.username} saved your pin "{pin.title}" to "{board.title}"',
+        notify_grouped(
+            pin.user,
+            'save',
+            f'pin:{pin.pk}',
+            f'saved your pin "{pin.title}"',
+            request.user,
             link=f'/pins/{pin.pk}/'
         )
-        # Send real-time notification via WebSocket
-        send_notification_to_user(pin.user, notification)
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({
@@ -239,21 +231,25 @@ def add_comment(request, pk):
         return JsonResponse({'success': False, 'error': 'Comment is too long (max 1000 characters)'}, status=400)
     
     # Create the comment
-    comment = Comment.objects.create(
-        pin=pin,
-        user=request.user,
-        text=text,
-        parent_id=parent_id if parent_id else None
-    )
+    with transaction.atomic():
+        comment = Comment.objects.create(
+            pin=pin,
+            user=request.user,
+            text=text,
+            parent_id=parent_id if parent_id else None
+        )
+        adjust_counter(Pin, pin.pk, 'comment_count', 1)
+        adjust_counter(Comment, comment.parent_id, 'reply_count', 1)
     
     # Create notification for pin owner (if not commenting on own pin)
+    from notifications.dispatch import notify, notify_grouped
     if pin.user != request.user:
-        from notifications.models import Notification
-        Notification.objects.create(
-            recipient=pin.user,
-            sender=request.user,
-            notification_type='comment',
-            message=f'{request.user.username} commented on your pin: "{text[:50]}..."',
+        notify_grouped(
+            pin.user,
+            'comment',
+            f'pin:{pin.id}',
+            f'commented on your pin "{pin.title}"',
+            request.user,
             link=f'/pins/{pin.id}/'
         )
     
@@ -261,12 +257,11 @@ def add_comment(request, pk):
     if parent_id:
         parent_comment = Comment.objects.filter(id=parent_id).first()
         if parent_comment and parent_comment.user != request.user:
-            from notifications.models import Notification
-            Notification.objects.create(
-                recipient=parent_comment.user,
+            notify(
+                parent_comment.user,
+                'comment',
+                f'{request.user.username} replied to your comment: "{text[:50]}..."',
                 sender=request.user,
-                notification_type='comment',
-                message=f'{request.user.username} replied to your comment: "{text[:50]}..."',
                 link=f'/pins/{pin.id}/'
             )
     
@@ -297,7 +292,11 @@ def delete_comment(request, pk, comment_id):
     if comment.user != request.user:
         return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
     
-    comment.delete()
+    with transaction.atomic():
+        # Replies are removed by the cascade, so count everything that went
+        _, deleted = comment.delete()
+        adjust_counter(Pin, pk, 'comment_count', -deleted.get(Comment._meta.label, 1))
+        adjust_counter(Comment, comment.parent_id, 'reply_count', -1)
     
     return JsonResponse({
         'success': True,
@@ -310,24 +309,26 @@ def like_comment(request, pk, comment_id):
     """Like or unlike a comment"""
     comment = get_object_or_404(Comment, id=comment_id, pin_id=pk)
     
-    if request.user in comment.likes.all():
-        comment.likes.remove(request.user)
-        is_liked = False
+    is_liked = toggle_like(comment, request.user)
+    
+    if not is_liked:
+        if comment.user != request.user:
+            from notifications.models import Notification
+            Notification.retract(comment.user, 'like', f'comment:{comment.id}', 'liked your comment', request.user)
     else:
-        comment.likes.add(request.user)
-        is_liked = True
-        
         # Create notification for comment author
         if comment.user != request.user:
-            from notifications.models import Notification
-            Notification.objects.create(
-                recipient=comment.user,
-                sender=request.user,
-                notification_type='like',
-                pin=comment.pin,
-                text=f'{request.user.username} liked your comment'
+            from notifications.dispatch import notify_grouped
+            notify_grouped(
+                comment.user,
+                'like',
+                f'comment:{comment.id}',
+                'liked your comment',
+                request.user,
+                link=f'/pins/{pk}/'
             )
     
+    comment.refresh_from_db(fields=['like_count'])
     return JsonResponse({
         'success': True,
         'is_liked': is_liked,
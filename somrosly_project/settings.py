@@ -258,12 +258,112 @@ PAYPAL_PLAN_ID = config('PAYPAL_PLAN_ID', default='')  # Recurring subscription
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
 
+# Threads generating pin image renditions in the background
+PIN_IMAGE_WORKERS = config('PIN_IMAGE_WORKERS', default=2, cast=int)
+
+# Most notifications the background dispatcher pushes per channel layer round
+# (see notifications.dispatch)
+NOTIFICATION_DISPATCH_BATCH = config('NOTIFICATION_DISPATCH_BATCH', default=100, cast=int)
+
+# Seconds between realtime notification pushes to one recipient; pushes in
+# between are held back and only the latest is sent
+NOTIFICATION_PUSH_INTERVAL = config('NOTIFICATION_PUSH_INTERVAL', default=2.0, cast=float)
+
+# Likes, saves and comments on the same target fold into one unread
+# notification while it keeps seeing activity within this many seconds
+NOTIFICATION_COALESCE_WINDOW = config('NOTIFICATION_COALESCE_WINDOW', default=3600, cast=int)
+
+# Cache Configuration
+# Local memory in development; set REDIS_URL (e.g. redis://localhost:6379/1)
+# to share the cache between workers in production.
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'somrosly',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'somrosly',
+        }
+    }
+
+# Seconds the explore page's first-page sections stay cached
+EXPLORE_CACHE_TTL = config('EXPLORE_CACHE_TTL', default=300, cast=int)
+
+# Cached unread counters are invalidated on every change; the TTL only bounds
+# staleness from a read racing a concurrent write
+UNREAD_CACHE_TTL = config('UNREAD_CACHE_TTL', default=300, cast=int)
+
+# Cached per-user friend id sets are invalidated whenever a friendship is
+# accepted, rejected or removed; the TTL only bounds staleness
+FRIENDS_CACHE_TTL = config('FRIENDS_CACHE_TTL', default=3600, cast=int)
+
+# Friend suggestions (rebuilt by `python manage.py rebuild_friend_suggestions`)
+FRIEND_SUGGESTIONS_PER_USER = config('FRIEND_SUGGESTIONS_PER_USER', default=50, cast=int)
+# Pins liked by more users than this don't count as shared taste
+FRIEND_SUGGESTION_MAX_PIN_LIKES = config('FRIEND_SUGGESTION_MAX_PIN_LIKES', default=500, cast=int)
+
+# User type-ahead (users.search): seconds results are cached (a rename shows
+# up after at most this long) and the most results one request may ask for
+USER_SEARCH_CACHE_TTL = config('USER_SEARCH_CACHE_TTL', default=60, cast=int)
+USER_SEARCH_MAX_RESULTS = config('USER_SEARCH_MAX_RESULTS', default=20, cast=int)
+
+# Retention (applied by `python manage.py prune_old_rows`); 0 keeps rows forever
+READ_NOTIFICATION_RETENTION_DAYS = config('READ_NOTIFICATION_RETENTION_DAYS', default=90, cast=int)
+NOTIFICATION_RETENTION_DAYS = config('NOTIFICATION_RETENTION_DAYS', default=365, cast=int)
+EMAIL_OTP_RETENTION_HOURS = config('EMAIL_OTP_RETENTION_HOURS', default=24, cast=int)
+PASSWORD_RESET_RETENTION_DAYS = config('PASSWORD_RESET_RETENTION_DAYS', default=7, cast=int)
+CHAT_MESSAGE_RETENTION_DAYS = config('CHAT_MESSAGE_RETENTION_DAYS', default=0, cast=int)
+
 # Channels Configuration
 ASGI_APPLICATION = 'somrosly_project.asgi.application'
 
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer'
+# Set CHANNEL_REDIS_URL (defaults to REDIS_URL) to fan out WebSocket events
+# across processes through Redis. Without it the in-memory layer is used,
+# which only works inside a single Daphne process. channels_redis keeps a
+# connection pool per host and event loop. For CI, `python manage.py
+# run_fake_redis` serves a fake Redis that several processes can share.
+CHANNEL_REDIS_URL = config('CHANNEL_REDIS_URL', default=REDIS_URL)
+
+if CHANNEL_REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [CHANNEL_REDIS_URL],
+                'prefix': config('CHANNEL_PREFIX', default='somrosly'),
+                # Seconds an undelivered message waits in a channel
+                'expiry': config('CHANNEL_MESSAGE_EXPIRY', default=60, cast=int),
+                # Seconds a channel stays in a group without being re-added
+                'group_expiry': config('CHANNEL_GROUP_EXPIRY', default=86400, cast=int),
+                # Messages buffered per channel before sends raise ChannelFull
+                'capacity': config('CHANNEL_CAPACITY', default=100, cast=int),
+                'channel_capacity': {
+                    'http.request': 200,
+                    'websocket.send*': config('CHANNEL_WEBSOCKET_CAPACITY', default=200, cast=int),
+                },
+            },
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer'
+        }
     }
-}
 ALLOWED_IMAGE_TYPES = ['image/jpeg', 'image/png', 'image/gif', 'image/webp']
+
+# Search backend for pins (dotted path). Empty picks MySQL FULLTEXT on MySQL
+# and the in-process BM25 index everywhere else.
+SEARCH_BACKEND = config('SEARCH_BACKEND', default='')
+
+# Size of the pre-shuffled sample behind explore's random section
+# (rebuilt by `python manage.py reshuffle_explore_sample`)
+EXPLORE_RANDOM_SAMPLE_SIZE = config('EXPLORE_RANDOM_SAMPLE_SIZE', default=5000, cast=int)
@@ -1,104 +1,228 @@
 """
 Management command to migrate local media files to MinIO/S3 storage
+
+Uploads run concurrently in a thread pool, large files go up as multipart
+uploads, objects already in the bucket with the same size (and ETag, when
+--verify-etag is given) are skipped, and finished keys are appended to a
+checkpoint file so an interrupted run resumes where it stopped.
 """
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from users.models import User
+from pins.images import FORMATS
 from pins.models import Pin
-import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import threading
+import time
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
+from botocore.exceptions import ClientError
+
+MB = 1024 * 1024
 
 
 class Command(BaseCommand):
     help = 'Migrate local media files to MinIO/S3 storage'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent uploads')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rows fetched per database round trip')
+        parser.add_argument('--multipart-threshold', type=int, default=8, help='Files above this many MB use multipart upload')
+        parser.add_argument('--checkpoint', default=str(settings.BASE_DIR / '.media_migration_checkpoint'),
+                            help='File recording uploaded keys so interrupted runs can resume')
+        parser.add_argument('--reset', action='store_true', help='Ignore and clear the checkpoint file')
+        parser.add_argument('--verify-etag', action='store_true',
+                            help='Also compare MD5/ETag (not just size) before skipping an existing object')
+
     def handle(self, *args, **options):
         if not settings.USE_S3:
             self.stdout.write(self.style.ERROR('S3 storage is not enabled in settings'))
             return
 
-        # Initialize S3 client
-        s3_client = boto3.client(
+        # boto3 clients are thread-safe, so the pool shares one (and its connection pool)
+        self.s3_client = boto3.client(
             's3',
             endpoint_url=settings.AWS_S3_ENDPOINT_URL,
             aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
             aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            config=Config(signature_version='s3v4'),
+            config=Config(signature_version='s3v4', max_pool_connections=options['workers'] * 2),
             region_name=settings.AWS_S3_REGION_NAME,
             use_ssl=settings.AWS_S3_USE_SSL,
             verify=settings.AWS_S3_VERIFY
         )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=options['multipart_threshold'] * MB,
+            multipart_chunksize=options['multipart_threshold'] * MB,
+            max_concurrency=4,
+        )
+        self.bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+        self.media_root = settings.BASE_DIR / 'media'
+        self.verify_etag = options['verify_etag']
+
+        self.checkpoint_path = options['checkpoint']
+        self.done_keys = set() if options['reset'] else self.load_checkpoint()
+        self.checkpoint_lock = threading.Lock()
+        self.checkpoint_file = open(self.checkpoint_path, 'w' if options['reset'] else 'a')
+
+        self.stats = {'uploaded': 0, 'skipped': 0, 'missing': 0, 'errors': 0, 'bytes': 0}
+        self.stats_lock = threading.Lock()
+        self.started = time.monotonic()
+        self.processed = 0
 
-        bucket_name = settings.AWS_STORAGE_BUCKET_NAME
-        media_root = settings.BASE_DIR / 'media'
-        
-        uploaded_count = 0
-        error_count = 0
-
-        # Migrate user profile pictures
-        self.stdout.write('Migrating user profile pictures...')
-        for user in User.objects.filter(profile_picture__isnull=False):
-            if user.profile_picture:
-                local_path = media_root / str(user.profile_picture)
-                
-                if local_path.exists():
-                    try:
-                        # Upload to S3/MinIO
-                        with open(local_path, 'rb') as f:
-                            s3_client.upload_fileobj(
-                                f,
-                                bucket_name,
-                                str(user.profile_picture),
-                                ExtraArgs={
-                                    'ContentType': self.get_content_type(str(user.profile_picture)),
-                                    'ACL': 'public-read'
-                                }
-                            )
-                        
-                        self.stdout.write(self.style.SUCCESS(f'✓ Uploaded: {user.profile_picture}'))
-                        uploaded_count += 1
-                    except Exception as e:
-                        self.stdout.write(self.style.ERROR(f'✗ Error uploading {user.profile_picture}: {str(e)}'))
-                        error_count += 1
-                else:
-                    self.stdout.write(self.style.WARNING(f'⚠ File not found: {local_path}'))
-
-        # Migrate pin images
-        self.stdout.write('\nMigrating pin images...')
-        for pin in Pin.objects.all():
-            if pin.image:
-                local_path = media_root / str(pin.image)
-                
-                if local_path.exists():
-                    try:
-                        # Upload to S3/MinIO
-                        with open(local_path, 'rb') as f:
-                            s3_client.upload_fileobj(
-                                f,
-                                bucket_name,
-                                str(pin.image),
-                                ExtraArgs={
-                                    'ContentType': self.get_content_type(str(pin.image)),
-                                    'ACL': 'public-read'
-                                }
-                            )
-                        
-                        self.stdout.write(self.style.SUCCESS(f'✓ Uploaded: {pin.image}'))
-                        uploaded_count += 1
-                    except Exception as e:
-                        self.stdout.write(self.style.ERROR(f'✗ Error uploading {pin.image}: {str(e)}'))
-                        error_count += 1
-                else:
-                    self.stdout.write(self.style.WARNING(f'⚠ File not found: {local_path}'))
+        try:
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                self.stdout.write('Migrating user profile pictures...')
+                profile_pictures = (
+                    User.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True)
+                    .values_list('profile_picture', flat=True)
+                    .iterator(chunk_size=options['chunk_size'])
+                )
+                self.run_batch(executor, profile_pictures, options['workers'])
+
+                self.stdout.write('\nMigrating pin images...')
+                pin_images = (
+                    Pin.objects.exclude(image='')
+                    .values_list('image', flat=True)
+                    .iterator(chunk_size=options['chunk_size'])
+                )
+                self.run_batch(executor, pin_images, options['workers'])
+
+                self.stdout.write('\nMigrating pin image renditions...')
+                self.run_batch(executor, self.rendition_paths(options['chunk_size']), options['workers'])
+        finally:
+            self.checkpoint_file.close()
 
         # Summary
+        elapsed = time.monotonic() - self.started
         self.stdout.write('\n' + '='*50)
-        self.stdout.write(self.style.SUCCESS(f'✓ Successfully uploaded: {uploaded_count} files'))
-        if error_count > 0:
-            self.stdout.write(self.style.ERROR(f'✗ Errors: {error_count} files'))
+        self.stdout.write(self.style.SUCCESS(f'✓ Successfully uploaded: {self.stats["uploaded"]} files'))
+        self.stdout.write(f'↷ Skipped (already in bucket): {self.stats["skipped"]} files')
+        if self.stats['missing']:
+            self.stdout.write(self.style.WARNING(f'⚠ Missing locally: {self.stats["missing"]} files'))
+        if self.stats['errors'] > 0:
+            self.stdout.write(self.style.ERROR(f'✗ Errors: {self.stats["errors"]} files'))
+        self.stdout.write(f'⏱ {elapsed:.1f}s, {self.throughput(elapsed)}')
         self.stdout.write('='*50)
 
+    def rendition_paths(self, chunk_size):
+        """Every stored file listed in ``Pin.renditions`` (thumb/detail/full, WebP and JPEG)"""
+        renditions = (
+            Pin.objects.exclude(renditions={})
+            .values_list('renditions', flat=True)
+            .iterator(chunk_size=chunk_size)
+        )
+        for entries in renditions:
+            for entry in entries.values():
+                for extension, _, _ in FORMATS:
+                    if entry.get(extension):
+                        yield entry[extension]
+
+    def run_batch(self, executor, keys, workers):
+        """Feed keys to the pool, keeping a bounded number of uploads in flight"""
+        pending = set()
+        for key in keys:
+            key = str(key)
+            if key in self.done_keys:
+                self.record('skipped')
+                continue
+            pending.add(executor.submit(self.migrate_file, key))
+            if len(pending) >= workers * 4:
+                finished = next(as_completed(pending))
+                pending.remove(finished)
+                self.report(finished)
+        for finished in as_completed(pending):
+            self.report(finished)
+
+    def migrate_file(self, key):
+        """Upload one file unless the bucket already holds an identical copy"""
+        local_path = self.media_root / key
+        if not local_path.exists():
+            return key, 'missing', 0, f'File not found: {local_path}'
+
+        size = local_path.stat().st_size
+        if self.already_uploaded(key, local_path, size):
+            self.mark_done(key)
+            return key, 'skipped', 0, None
+
+        try:
+            with open(local_path, 'rb') as f:
+                self.s3_client.upload_fileobj(
+                    f,
+                    self.bucket_name,
+                    key,
+                    ExtraArgs={
+                        'ContentType': self.get_content_type(key),
+                        'ACL': 'public-read'
+                    },
+                    Config=self.transfer_config
+                )
+        except Exception as e:
+            return key, 'errors', 0, str(e)
+
+        self.mark_done(key)
+        return key, 'uploaded', size, None
+
+    def already_uploaded(self, key, local_path, size):
+        try:
+            head = self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
+        except ClientError:
+            return False
+        if head.get('ContentLength') != size:
+            return False
+        if not self.verify_etag:
+            return True
+
+        etag = head.get('ETag', '').strip('"')
+        if '-' in etag:
+            # Multipart ETags aren't a plain MD5; matching size is the best we can do
+            return True
+        md5 = hashlib.md5()
+        with open(local_path, 'rb') as f:
+            for block in iter(lambda: f.read(MB), b''):
+                md5.update(block)
+        return md5.hexdigest() == etag
+
+    def mark_done(self, key):
+        with self.checkpoint_lock:
+            self.checkpoint_file.write(key + '\n')
+            self.checkpoint_file.flush()
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                return {line.strip() for line in f if line.strip()}
+        except FileNotFoundError:
+            return set()
+
+    def record(self, outcome, size=0):
+        with self.stats_lock:
+            self.stats[outcome] += 1
+            self.stats['bytes'] += size
+            self.processed += 1
+            return self.processed
+
+    def report(self, future):
+        key, outcome, size, error = future.result()
+        processed = self.record(outcome, size)
+
+        if outcome == 'uploaded':
+            self.stdout.write(self.style.SUCCESS(f'✓ Uploaded: {key}'))
+        elif outcome == 'missing':
+            self.stdout.write(self.style.WARNING(f'⚠ {error}'))
+        elif outcome == 'errors':
+            self.stdout.write(self.style.ERROR(f'✗ Error uploading {key}: {error}'))
+
+        if processed % 100 == 0:
+            elapsed = time.monotonic() - self.started
+            self.stdout.write(f'… {processed} files processed, {self.throughput(elapsed)}')
+
+    def throughput(self, elapsed):
+        elapsed = max(elapsed, 0.001)
+        return (f'{self.stats["uploaded"] / elapsed:.1f} files/s, '
+                f'{self.stats["bytes"] / MB / elapsed:.2f} MB/s')
+
     def get_content_type(self, filename):
         """Determine content type based on file extension"""
         extension = filename.lower().split('.')[-1]
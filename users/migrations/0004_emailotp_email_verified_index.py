@@ -0,0 +1,17 @@
+# Generated by Django 5.1.13 on 2026-10-17 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_emailotp'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emailotp',
+            index=models.Index(fields=['email', 'is_verified', '-created_at'], name='otp_email_verified_idx'),
+        ),
+    ]
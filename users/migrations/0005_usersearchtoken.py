@@ -0,0 +1,52 @@
+# Generated by Django 5.1.13 on 2026-10-17 17:30
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def normalize(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def index_users(apps, schema_editor):
+    """Tokenize every existing user the way users.search does"""
+    User = apps.get_model('users', 'User')
+    UserSearchToken = apps.get_model('users', 'UserSearchToken')
+
+    split = re.compile(r'[^0-9a-z]+')
+    tokens = []
+    for user_id, username, first_name, last_name in User.objects.values_list(
+        'id', 'username', 'first_name', 'last_name'
+    ).iterator(chunk_size=2000):
+        words = {normalize(username)[:64]}
+        for field in (username, first_name, last_name):
+            words.update(word[:64] for word in split.split(normalize(field)) if word)
+        tokens.extend(UserSearchToken(user_id=user_id, token=word) for word in words if word)
+    UserSearchToken.objects.bulk_create(tokens, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_emailotp_email_verified_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('token', 'user')},
+            },
+        ),
+        migrations.RunPython(index_users, migrations.RunPython.noop),
+    ]
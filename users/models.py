@@ -1,5 +1,5 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.utils.crypto import get_random_string
 from django.utils import timezone
 from datetime import timedelta
@@ -38,6 +38,15 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
     
+    def save(self, *args, **kwargs):
+        """Refresh the user's search tokens when their username or name changes"""
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if update_fields is None or {'username', 'first_name', 'last_name'} & set(update_fields):
+                from .search import index_user
+                index_user(self)
+    
     def generate_verification_token(self):
         """Generate a unique verification token"""
         self.email_verification_token = get_random_string(64)
@@ -50,6 +59,22 @@ class User(AbstractUser):
         return f"{self.first_name} {self.last_name}".strip() or self.username
 
 
+class UserSearchToken(models.Model):
+    """
+    Normalized word of a user's username or name (lower-cased, accents
+    stripped), so type-ahead is a prefix range scan on the token index.
+    Kept in sync by ``User.save`` through users.search.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=64)
+    
+    class Meta:
+        unique_together = ('token', 'user')
+    
+    def __str__(self):
+        return f"{self.token} -> {self.user_id}"
+
+
 class PasswordResetToken(models.Model):
     """Model for password reset tokens"""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -82,6 +107,9 @@ class EmailOTP(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['email', 'is_verified', '-created_at'], name='otp_email_verified_idx'),
+        ]
     
     def __str__(self):
         return f"OTP for {self.email}"
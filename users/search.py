@@ -0,0 +1,116 @@
+"""
+Prefix search over users for friend search, mentions and the share dialog.
+
+Every user's username and first/last name are split into normalized tokens
+(lower-cased, accents stripped) stored in ``UserSearchToken``. A query is
+tokenized the same way and each query word must prefix-match one of the
+user's tokens, which is a range scan on the (token, user) index. Results are
+ranked exact username first, then username prefix, then alphabetically.
+``autocomplete`` wraps this for the JSON endpoint and caches the results.
+"""
+import re
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Value, When
+
+from .models import User, UserSearchToken
+
+SPLIT_RE = re.compile(r'[^0-9a-z]+')
+
+TOKEN_LENGTH = UserSearchToken._meta.get_field('token').max_length
+
+# Words of a query used for matching; the rest are ignored
+MAX_QUERY_TERMS = 3
+
+# Sorts after every token character, closing the prefix range
+PREFIX_END = '\uffff'
+
+
+def normalize(text):
+    """Lower-case and strip accents: 'Zoë' -> 'zoe'"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return [token[:TOKEN_LENGTH] for token in SPLIT_RE.split(normalize(text)) if token]
+
+
+def tokens_for(user):
+    """The whole username plus every word of the username and name"""
+    username = normalize(user.username)[:TOKEN_LENGTH]
+    tokens = {username} if username else set()
+    for field in (user.username, user.first_name, user.last_name):
+        tokens.update(tokenize(field))
+    return tokens
+
+
+def index_user(user):
+    """Bring the user's stored tokens in line with their current username and name"""
+    tokens = tokens_for(user)
+    stored = set(UserSearchToken.objects.filter(user_id=user.pk).values_list('token', flat=True))
+    if stored - tokens:
+        UserSearchToken.objects.filter(user_id=user.pk, token__in=stored - tokens).delete()
+    if tokens - stored:
+        UserSearchToken.objects.bulk_create(
+            [UserSearchToken(user_id=user.pk, token=token) for token in tokens - stored],
+            ignore_conflicts=True
+        )
+
+
+def tokens_with_prefix(term):
+    """
+    Tokens starting with ``term`` as a plain range on the token index. Tokens
+    are already lower-cased, so this avoids ``startswith``, which SQLite
+    can't serve from the index and MySQL turns into ``LIKE BINARY``.
+    """
+    return UserSearchToken.objects.filter(token__gte=term, token__lt=term + PREFIX_END)
+
+
+def search_users(query, friends_of=None):
+    """
+    Ranked queryset of active users matching ``query``; ``friends_of`` (a
+    user id) restricts it to that user's friends. An email address matches
+    that exact account instead.
+    """
+    users = User.objects.filter(is_active=True)
+    if friends_of is not None:
+        users = users.filter(friend_of_edges__user_id=friends_of)
+
+    query = query.strip()
+    if '@' in query:
+        return users.filter(email__iexact=query)
+
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    if not terms:
+        return users.none()
+    for term in terms:
+        users = users.filter(pk__in=tokens_with_prefix(term).values('user_id'))
+
+    return users.annotate(
+        rank=Case(
+            When(username__iexact=query, then=Value(0)),
+            When(username__istartswith=terms[0], then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        )
+    ).order_by('rank', 'username')
+
+
+def autocomplete(query, limit=8, friends_of=None):
+    """Type-ahead results as JSON-ready dicts, cached for USER_SEARCH_CACHE_TTL seconds"""
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    key = f'usersearch:{friends_of or 0}:{limit}:{query.strip().lower() if "@" in query else "|".join(terms)}'
+    results = cache.get(key)
+    if results is None:
+        users = search_users(query, friends_of).only('id', 'username', 'first_name', 'last_name', 'profile_picture')
+        results = [{
+            'id': user.id,
+            'username': user.username,
+            'full_name': user.full_name,
+            'profile_picture': user.profile_picture.url if user.profile_picture else None,
+        } for user in users[:limit]]
+        cache.set(key, results, settings.USER_SEARCH_CACHE_TTL)
+    return results
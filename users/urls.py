@@ -15,4 +15,5 @@ urlpatterns = [
     path('verify-email/<str:token>/', views.verify_email, name='verify_email'),
     path('password-reset/', views.password_reset_request, name='password_reset_request'),
     path('password-reset/<str:token>/', views.password_reset, name='password_reset'),
+    path('api/search/', views.user_search_api, name='user_search_api'),
 ]
@@ -3,6 +3,7 @@ from django.contrib.auth import login, logout, authenticate, update_session_auth
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Count
+from django.http import JsonResponse
 from django.core.mail import send_mail
 from django.conf import settings
 from django.urls import reverse
@@ -370,3 +371,21 @@ def password_reset(request, token):
         form = PasswordResetForm()
     
     return render(request, 'users/password_reset.html', {'form': form, 'token': token})
+
+
+@login_required
+def user_search_api(request):
+    """Type-ahead user search for friend search, mentions and sharing (?q=, &limit=, &friends=1)"""
+    from .search import autocomplete
+    
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'users': []})
+    
+    try:
+        limit = min(max(int(request.GET.get('limit', 8)), 1), settings.USER_SEARCH_MAX_RESULTS)
+    except ValueError:
+        limit = 8
+    friends_of = request.user.id if request.GET.get('friends') == '1' else None
+    
+    return JsonResponse({'users': autocomplete(query, limit, friends_of)})